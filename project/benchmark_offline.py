@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Benchmark offline HomeMatch load, query, batch and startup costs at configurable corpus sizes."""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from synthetic_listings import synthetic_profile_answers, write_synthetic_listings, write_synthetic_profiles
+
+PATHS = ("cosine", "sharded", "filtered")
+RESULTS_SCHEMA = 2
+# Throughput metrics compared against a baseline (higher is better); timings ending in _ms/seconds are lower-is-better.
+HIGHER_IS_BETTER = ("profiles_per_s",)
+MIN_REGRESSION_MS = 5.0  # timings must also be this much slower to count, so jitter on tiny timings is ignored
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process so far (monotonic, so only meaningful for the run as a whole)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / 1024, 1)
+
+def rss_mb() -> Optional[float]:
+    """Current RSS from /proc/self/statm (None where it is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+def rss_delta_mb(before: Optional[float]) -> Optional[float]:
+    after = rss_mb()
+    return round(after - before, 1) if before is not None and after is not None else None
+
+def timed(fn: Callable):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def measured(fn: Callable):
+    """Run `fn`; returns its result and {"seconds", "rss_delta_mb"} for the call."""
+    before = rss_mb()
+    result, t = timed(fn)
+    return result, {"seconds": round(t, 4), "rss_delta_mb": rss_delta_mb(before)}
+
+def latency_summary(latencies: List[float]) -> dict:
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "queries": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "qps": round(len(ms) / (ms.sum() / 1000.0), 1) if ms.sum() else None,
+    }
+
+def ensure_corpus(data_dir: str, size: int, seed: int) -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{size}_s{seed}.json")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        write_synthetic_listings(tmp, size, seed)
+        os.replace(tmp, path)
+    return path
+
+def ensure_profiles(data_dir: str, n: int, seed: int) -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"profiles_{n}_s{seed}.jsonl")
+    if not os.path.exists(path):
+        write_synthetic_profiles(path, n, seed)
+    return path
+
+def wall_ms(cmd: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000.0
+
+def measure_startup(args, listings_path: str) -> dict:
+    """Cold-process wall time of the CLI: --help, and one query from an already built snapshot."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "homematch_offline.py")
+    index_dir = tempfile.mkdtemp(prefix="homematch-bench-")
+    try:
+        query_cmd = [sys.executable, script, "--listings", listings_path, "--index-dir", index_dir, "--k", str(args.k)]
+        subprocess.run(query_cmd, check=True, stdout=subprocess.DEVNULL)  # build the snapshot (not timed)
+        help_ms = [wall_ms([sys.executable, script, "--help"]) for _ in range(args.startup_runs)]
+        query_ms = [wall_ms(query_cmd) for _ in range(args.startup_runs)]
+        imports = subprocess.run([sys.executable, "-X", "importtime"] + query_cmd[1:], check=True,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    query_median = float(np.median(query_ms))
+    return {
+        "help": {"median_ms": round(float(np.median(help_ms)), 1), "runs": len(help_ms)},
+        "query": {
+            "median_ms": round(query_median, 1), "runs": len(query_ms),
+            "imports_sklearn": any(line.rsplit("|", 1)[-1].strip().startswith("sklearn") for line in imports.splitlines()),
+            "within_budget": query_median <= args.startup_budget_ms,
+        },
+    }
+
+def run_size(args, size: int) -> dict:
+    """Measure one corpus size in this process (invoked in a child by `main`)."""
+    from homematch_index import load_listing_store, load_or_build_index, load_snapshot, snapshot_path
+    from homematch_offline import (
+        build_vector_index, format_buyer_profile, load_listings, retrieve_top_k, run_batch,
+    )
+    from near_duplicates import DEDUP_SETTINGS
+
+    listings_path = ensure_corpus(args.data_dir, size, args.seed)
+    profiles_path = ensure_profiles(args.data_dir, args.batch_profiles, args.seed)
+    queries = [format_buyer_profile(synthetic_profile_answers(i, args.seed)) for i in range(args.queries)]
+    result = {"size": size, "stages": {}, "query": {}, "batch": {}}
+    stages = result["stages"]
+
+    docs, stages["load_listings"] = measured(lambda: load_listings(listings_path))
+    stages["load_listings"]["store_mb"] = round(docs.nbytes() / 1e6, 1)
+    # Loading with near-duplicate removal, as the CLI does by default; later stages use this store.
+    del docs
+    docs, stages["load_listings_dedup"] = measured(lambda: load_listings(listings_path, DEDUP_SETTINGS))
+    stages["load_listings_dedup"]["dropped"] = docs.n_dropped
+
+    # Import scikit-learn up front so the fit timing below is the fit alone.
+    _, t = timed(lambda: __import__("sklearn.feature_extraction.text"))
+    stages["sklearn_import"] = {"seconds": round(t, 4)}
+    (_, X_fit), stages["build_vector_index"] = measured(lambda: build_vector_index(docs))
+    stages["build_vector_index"].update(nnz=int(X_fit.nnz), terms=int(X_fit.shape[1]))
+    del X_fit
+
+    index_dir = tempfile.mkdtemp(prefix="homematch-bench-")
+    try:
+        _, stages["snapshot_build"] = measured(lambda: load_or_build_index(
+            listings_path, lambda: docs, index_dir=index_dir, rebuild=True, dedup=DEDUP_SETTINGS))
+        load_listing_store(listings_path, DEDUP_SETTINGS, index_dir)
+        _, stages["load_listings_dedup_cached"] = measured(
+            lambda: load_listing_store(listings_path, DEDUP_SETTINGS, index_dir))
+        snapshot, stages["snapshot_load"] = measured(lambda: load_snapshot(snapshot_path(listings_path, index_dir)))
+        vectorizer, X = snapshot.vectorizer, snapshot.matrix
+
+        price_cap = float(np.median(docs.columns["price"]))
+        candidates = docs.numeric_index.filter_rows({"price": (None, price_cap)})
+
+        searchers = {
+            "cosine": lambda q: retrieve_top_k(vectorizer, X, q, args.k),
+            "sharded": lambda q: retrieve_top_k(vectorizer, X, q, args.k, shard_rows=args.shard_rows),
+            "filtered": lambda q: retrieve_top_k(vectorizer, X, q, args.k, candidates=candidates),
+        }
+        batch_out = os.path.join(index_dir, "batch.jsonl")
+        for path in args.paths:
+            search = searchers[path]
+            for q in queries[:3]:
+                search(q)  # warm caches and page in mapped arrays
+            latencies = []
+            before = rss_mb()
+            for q in queries:
+                start = time.perf_counter()
+                search(q)
+                latencies.append(time.perf_counter() - start)
+            summary = latency_summary(latencies)
+            summary["rss_delta_mb"] = rss_delta_mb(before)
+            result["query"][path] = summary
+
+            if path == "sharded":
+                continue  # batch mode always scores the whole matrix with one sparse product per chunk
+            n, batch = measured(lambda: run_batch(
+                vectorizer, X, docs, profiles_path, batch_out, args.k, args.chunk_size,
+                candidates if path == "filtered" else None))
+            t = batch["seconds"]
+            result["batch"][path] = dict(batch, profiles=n, profiles_per_s=round(n / t, 1) if t else None)
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def environment() -> dict:
+    import scipy
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__, "platform": platform.platform(), "cpus": os.cpu_count(),
+        "git_commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def flatten_metrics(result: dict) -> Dict[str, float]:
+    """{"query.cosine.p50_ms": ..., "stages.load_listings.seconds": ...} for baseline comparison."""
+    flat = {}
+    for section in ("stages", "query", "batch", "startup"):
+        for name, metrics in result.get(section, {}).items():
+            for key, value in metrics.items():
+                if isinstance(value, (int, float)) and (key.endswith(("_ms", "seconds")) or key in HIGHER_IS_BETTER):
+                    flat[f"{section}.{name}.{key}"] = value
+    return flat
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> List[str]:
+    """Lines describing metrics that got worse than the baseline by more than `threshold`."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["size"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(result["size"])
+        if old is None:
+            continue
+        before = flatten_metrics(old)
+        for key, now in flatten_metrics(result).items():
+            was = before.get(key)
+            if not was or now is None:
+                continue
+            if key.endswith(HIGHER_IS_BETTER):
+                worse = was / now - 1.0 if now else float("inf")
+            else:
+                worse = now / was - 1.0
+                if (now - was) * (1.0 if key.endswith("_ms") else 1000.0) < MIN_REGRESSION_MS:
+                    continue
+            if worse > threshold:
+                regressions.append(f"{result['size']:>10,}  {key}: {was} -> {now} ({worse:+.0%})")
+    return regressions
+
+def print_table(results: List[dict]) -> None:
+    print(f"\n{'size':>10}  {'path':<9} {'p50 ms':>9} {'p99 ms':>9} {'batch/s':>10}")
+    for r in results:
+        for path, q in r["query"].items():
+            batch = r["batch"].get(path, {}).get("profiles_per_s")
+            print(f"{r['size']:>10,}  {path:<9} {q['p50_ms']:>9.3f} {q['p99_ms']:>9.3f} "
+                  f"{batch if batch is not None else '-':>10}")
+        stages = r["stages"]
+        dedup = stages["load_listings_dedup"]
+        print(f"{'':>10}  load {stages['load_listings']['seconds']:.2f}s, with near-duplicate removal "
+              f"{dedup['seconds']:.2f}s ({dedup['dropped']} dropped), cached "
+              f"{stages['load_listings_dedup_cached']['seconds']:.2f}s")
+        print(f"{'':>10}  fit {stages['build_vector_index']['seconds']:.2f}s, "
+              f"snapshot build {stages['snapshot_build']['seconds']:.2f}s / load {stages['snapshot_load']['seconds']:.3f}s, "
+              f"peak RSS {r['peak_rss_mb']} MB")
+        if "startup" in r:
+            startup = r["startup"]
+            print(f"{'':>10}  startup: --help {startup['help']['median_ms']:.0f} ms, "
+                  f"query {startup['query']['median_ms']:.0f} ms "
+                  f"({'within' if startup['query']['within_budget'] else 'OVER'} {r['startup_budget_ms']:.0f} ms budget"
+                  f"{', imports scikit-learn' if startup['query']['imports_sklearn'] else ''})")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline HomeMatch on synthetic corpora")
+    ap.add_argument("--sizes", default="1000,10000", help="Comma-separated corpus sizes, e.g. 10000,1000000")
+    ap.add_argument("--paths", default=",".join(PATHS), help=f"Retrieval paths to measure (from {', '.join(PATHS)})")
+    ap.add_argument("--queries", type=int, default=200, help="Timed queries per path")
+    ap.add_argument("--batch-profiles", type=int, default=2000, help="Profiles per batch-throughput run")
+    ap.add_argument("--chunk-size", type=int, default=512, help="Batch-mode chunk size")
+    ap.add_argument("--shard-rows", type=int, default=50000, help="Shard size for the sharded path")
+    ap.add_argument("--k", type=int, default=3, help="Top-k per query")
+    ap.add_argument("--seed", type=int, default=0, help="Synthetic corpus seed")
+    ap.add_argument("--data-dir", default=".homematch_bench", help="Where generated corpora are cached")
+    ap.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    ap.add_argument("--baseline", default=None, help="Earlier results file to compare against")
+    ap.add_argument("--regression-threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    ap.add_argument("--startup-runs", type=int, default=5, help="Cold CLI runs per startup measurement (0 = skip)")
+    ap.add_argument("--startup-budget-ms", type=float, default=1000.0,
+                    help="Wall-time budget for a single query answered from a warm snapshot")
+    ap.add_argument("--run-size", type=int, default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--child-output", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    args.paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    unknown = sorted(set(args.paths) - set(PATHS))
+    if unknown:
+        raise SystemExit(f"Unknown paths: {', '.join(unknown)}")
+
+    if args.run_size is not None:
+        result = run_size(args, args.run_size)
+        with open(args.child_output, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    sizes = [int(s.replace("_", "")) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    for size in sizes:
+        print(f"Preparing {size:,} synthetic listings...")
+        ensure_corpus(args.data_dir, size, args.seed)
+        ensure_profiles(args.data_dir, args.batch_profiles, args.seed)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            child_output = tmp.name
+        try:
+            cmd = [sys.executable, os.path.abspath(__file__), "--run-size", str(size), "--child-output", child_output]
+            for flag in ("paths", "queries", "batch_profiles", "chunk_size", "shard_rows", "k", "seed", "data_dir"):
+                value = getattr(args, flag)
+                cmd += [f"--{flag.replace('_', '-')}", ",".join(value) if isinstance(value, list) else str(value)]
+            print(f"Benchmarking {size:,} listings...")
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+            with open(child_output, "r", encoding="utf-8") as f:
+                results.append(json.load(f))
+        finally:
+            os.unlink(child_output)
+        if args.startup_runs > 0:
+            print(f"Measuring CLI startup on {size:,} listings...")
+            results[-1]["startup"] = measure_startup(args, ensure_corpus(args.data_dir, size, args.seed))
+            results[-1]["startup_budget_ms"] = args.startup_budget_ms
+
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "environment": environment(),
+        "config": {key: getattr(args, key) for key in ("paths", "queries", "batch_profiles", "chunk_size",
+                                                        "shard_rows", "k", "seed", "startup_runs",
+                                                        "startup_budget_ms")},
+        "results": results,
+    }
+    # Compare before writing, so --baseline may name the same file as --output.
+    regressions = compare(results, args.baseline, args.regression_threshold) if args.baseline else []
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_table(results)
+    print(f"\nResults written to {args.output}.")
+
+    if args.baseline:
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (> {args.regression_threshold:.0%} worse):")
+            print("\n".join(regressions))
+            raise SystemExit(1)
+        print(f"\nNo regressions against {args.baseline}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Single-pass (Aho-Corasick) keyword matching of HomeMatch listing features into per-listing bitmasks."""
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FEATURE_KEYWORDS = {
+    "schools": ["school", "schools"],
+    "shopping": ["shopping", "market", "plaza", "grocery"],
+    "backyard": ["backyard", "garden", "yard", "patio"],
+    "garage": ["garage"],
+    "energy": ["energy", "insulation", "solar", "hvac"],
+    "transit": ["bus", "transit", "subway", "ferry"],
+    "highway": ["highway", "express"],
+    "bike": ["bike", "bikeshare", "cycle"],
+    "restaurants": ["restaurant", "dining", "eateries"],
+    "theaters": ["theater", "theatre", "arts", "galleries"],
+    "parks": ["park", "trails", "greenbelt"],
+}
+FEATURE_NAMES = list(FEATURE_KEYWORDS)
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over keyword groups; matches substrings exactly like `keyword in text`."""
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.names = list(groups)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[int] = [0]
+        for bit, name in enumerate(self.names):
+            for keyword in groups[name]:
+                state = 0
+                for ch in keyword.lower():
+                    if ch not in goto[state]:
+                        goto.append({})
+                        out.append(0)
+                        goto[state][ch] = len(goto) - 1
+                    state = goto[state][ch]
+                out[state] |= 1 << bit
+
+        alphabet = set(ch for edges in goto for ch in edges)
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        delta[0] = {ch: goto[0].get(ch, 0) for ch in alphabet}
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            out[state] |= out[fail[state]]
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    delta[state][ch] = delta[fail[state]][ch]
+                else:
+                    fail[nxt] = delta[fail[state]][ch]
+                    delta[state][ch] = nxt
+                    queue.append(nxt)
+        # Drop transitions back to the root; a missing key means "go to root".
+        self._delta = [{ch: nxt for ch, nxt in edges.items() if nxt} for edges in delta]
+        self._out = out
+        self.full_mask = (1 << len(self.names)) - 1
+
+    def scan(self, text: str) -> int:
+        """Bitmask of every keyword group that occurs in `text` (case-insensitive)."""
+        delta, out, full = self._delta, self._out, self.full_mask
+        state = mask = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                mask |= out[state]
+                if mask == full:
+                    break
+        return mask
+
+    def decode(self, mask: int) -> List[str]:
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+    def mask_for(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            if name not in self.names:
+                raise ValueError(f"Unknown feature '{name}'. Known features: {', '.join(self.names)}")
+            mask |= 1 << self.names.index(name)
+        return mask
+
+FEATURE_AUTOMATON = KeywordAutomaton(FEATURE_KEYWORDS)
+
+def feature_masks(texts: Iterable[str], automaton: KeywordAutomaton = FEATURE_AUTOMATON) -> "np.ndarray":
+    """Feature bitmask for each text, as computed once at index time."""
+    import numpy as np  # the automaton itself is used by the CLI before numpy is needed
+    return np.fromiter((automaton.scan(t) for t in texts), dtype=np.uint32)
@@ -1,15 +1,35 @@
-import json
 import os
+import sys
+import json
+import argparse
+import asyncio
+from collections.abc import Sequence
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 
+from homematch_batch import BATCH_CHUNK, DEFAULT_BATCH_OUTPUT, run_online_batch
+from homematch_cache import CachedEmbeddings, ResponseCache, response_key, text_hash
+from homematch_filtered import filtered_search
+from homematch_hnsw import collection_metadata, hnsw_settings, stored_settings
+from homematch_hybrid import hybrid_search, open_lexical_index
+from homematch_ingest import embedding_client, ingest, token_counter
+from homematch_metrics import InstrumentedEmbeddings, PipelineMetrics, UsageCallback
+from homematch_index import load_listing_store
+from homematch_personalize import (
+    RETRYABLE_ERRORS, personalize_in_rank_order, print_generation_timings, stream_in_rank_order,
+)
+from homematch_settings import AppSettings
+from listing_store import ListingStore
+from rate_limit import AsyncRateLimiter
+
 LISTINGS_FILE = "listings.json"
 PERSIST_DIRECTORY = "./chroma_db"
+SYNC_BATCH = 1000  # ids per Chroma get/delete call
 
 def load_environment():
     """Load .env, require API key, and optionally honor a custom base URL."""
@@ -24,54 +44,132 @@ def load_environment():
         print(f"Using custom OPENAI_API_BASE: {custom_base}")
     return True
 
-def load_and_prepare_listings():
-    """
-    Loads listings from JSON and converts them into LangChain Document objects
-    for ingestion into the vector database.
-    """
+class ListingDocuments(Sequence):
+    """Read-only sequence of LangChain Documents built on access from a columnar ListingStore."""
+    def __init__(self, store: ListingStore):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        row = self.store[i]
+        return Document(page_content=row.page_content, metadata=dict(row.metadata))
+
+def load_lexical_index(dedup=None):
+    """Loads (or builds and persists) the TF-IDF snapshot of the listings file for hybrid retrieval."""
+    print(f"Opening TF-IDF index for {LISTINGS_FILE}...")
+    try:
+        snapshot = open_lexical_index(LISTINGS_FILE, dedup)
+    except FileNotFoundError:
+        print(f"Error: '{LISTINGS_FILE}' not found.")
+        print("Please run `python generate_listings.py` first or provide a listings.json file or use the offline version.")
+        return None
+    print(f"Indexed {len(snapshot.store)} listings.")
+    return snapshot
+
+def load_and_prepare_listings(dedup=None):
+    """Loads listings from JSON, minus near-duplicates under `dedup`, as LangChain Document objects."""
     print(f"Loading listings from {LISTINGS_FILE}...")
     try:
-        with open(LISTINGS_FILE, "r", encoding="utf-8") as f:
-            listings_data = json.load(f)["listings"]
+        store = load_listing_store(LISTINGS_FILE, dedup=dedup)
     except FileNotFoundError:
         print(f"Error: '{LISTINGS_FILE}' not found.")
         print("Please run `python generate_listings.py` first or provide a listings.json file or use the offline version.")
         return None
 
-    documents = []
-    for i, listing in enumerate(listings_data):
-        content = (
-            f"Property Description: {listing['description']}\n"
-            f"Neighborhood: {listing['neighborhood_description']}"
-        )
-        metadata = {
-            "id": f"listing_{i}",
-            "neighborhood": listing['neighborhood'],
-            "price": listing['price'],
-            "bedrooms": listing['bedrooms'],
-            "bathrooms": listing['bathrooms'],
-            "house_size_sqft": listing['house_size_sqft'],
-            "full_description": listing['description'],
-            "neighborhood_description": listing['neighborhood_description']
-        }
-        documents.append(Document(page_content=content, metadata=metadata))
+    if store.n_dropped:
+        print(f"Dropped {store.n_dropped} near-duplicate listing(s).")
+    documents = ListingDocuments(store)
     print(f"Successfully loaded and prepared {len(documents)} documents.")
     return documents
 
-def setup_vector_database(documents, embeddings, persist_directory=PERSIST_DIRECTORY, reset=True):
-    """Initializes and persists the Chroma vector database."""
+def setup_vector_database(documents, embeddings, persist_directory=PERSIST_DIRECTORY, reset=True, metrics=None,
+                          hnsw=None, **ingest_options):
+    """Builds the persisted Chroma vector database from `documents`, deleting any existing one first if `reset`."""
     if reset and os.path.isdir(persist_directory):
         import shutil
         shutil.rmtree(persist_directory)
-    vectorstore = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=persist_directory
-    )
-    vectorstore.persist()
-    print(f"✅ Vector database created and persisted at {persist_directory}.")
+    return sync_vector_database(documents, embeddings, persist_directory, metrics, hnsw, **ingest_options)
+
+def document_hash(doc) -> str:
+    """Hash of a listing's text and metadata; a listing whose hash changed is re-embedded."""
+    return text_hash(doc.page_content + "\n" + json.dumps(doc.metadata, sort_keys=True))
+
+def sync_vector_database(documents, embeddings, persist_directory=PERSIST_DIRECTORY, metrics=None, hnsw=None,
+                         **ingest_options):
+    """Add, re-embed (via `ingest`) and delete listings by id and content hash so the collection matches `documents`."""
+    hnsw = hnsw or hnsw_settings()
+    # Chroma fixes HNSW settings at creation, so a collection built with others is rebuilt (from the embedding cache).
+    vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory,
+                         collection_metadata=collection_metadata(hnsw))
+    built_with = stored_settings(vectorstore._collection.metadata)
+    if built_with != hnsw:
+        print(f"HNSW settings changed ({built_with} -> {hnsw}); rebuilding the collection.")
+        vectorstore.delete_collection()
+        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory,
+                             collection_metadata=collection_metadata(hnsw))
+    stored = {}
+    offset = 0
+    while True:
+        page = vectorstore.get(include=["metadatas"], limit=SYNC_BATCH, offset=offset)
+        for doc_id, md in zip(page["ids"], page["metadatas"]):
+            stored[doc_id] = (md or {}).get("content_hash")
+        if len(page["ids"]) < SYNC_BATCH:
+            break
+        offset += SYNC_BATCH
+
+    changed, n_new = [], 0
+    seen = set()
+    for doc in documents:
+        doc_id = doc.metadata["id"]
+        seen.add(doc_id)
+        digest = document_hash(doc)
+        if stored.get(doc_id) != digest:
+            n_new += doc_id not in stored
+            changed.append((doc_id, doc.page_content, dict(doc.metadata, content_hash=digest)))
+    removed = [doc_id for doc_id in stored if doc_id not in seen]
+
+    for start in range(0, len(removed), SYNC_BATCH):
+        vectorstore.delete(ids=removed[start:start + SYNC_BATCH])
+
+    def write(ids, vectors, metadatas, texts):
+        if metrics is None:
+            vectorstore._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts)
+            return
+        with metrics.stage("chroma_write", vectors=len(ids)):
+            vectorstore._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts)
+
+    def progress(stats):
+        print(f"  ... {stats.written}/{stats.texts} vectors written")
+
+    if changed:
+        if "count_tokens" not in ingest_options:
+            ingest_options["count_tokens"] = token_counter(getattr(embeddings, "model", ""))
+        stats = asyncio.run(ingest(changed, embeddings, write, progress=progress, **ingest_options))
+        print(stats.summary())
+    print(f"✅ Vector database synced at {persist_directory}: {n_new} added, {len(changed) - n_new} updated, "
+          f"{len(removed)} deleted, {len(seen) - len(changed)} unchanged.")
     return vectorstore
 
+def open_vector_database(documents, embeddings, settings, metrics):
+    """Sync (or rebuild) the Chroma collection with the ingestion settings."""
+    ingest_options = dict(
+        limiter=AsyncRateLimiter(settings.embed_rpm, settings.embed_tpm),
+        concurrency=settings.embed_concurrency,
+        retries=settings.max_retries,
+        retry_on=RETRYABLE_ERRORS,
+        max_request_tokens=settings.embed_batch_tokens,
+        write_batch=settings.write_batch,
+    )
+    mode, hnsw = settings.vector_db_mode, settings.hnsw
+    with metrics.stage("vector_db", mode=mode):
+        if mode == "sync":
+            return sync_vector_database(documents, embeddings, metrics=metrics, hnsw=hnsw, **ingest_options)
+        return setup_vector_database(documents, embeddings, metrics=metrics, hnsw=hnsw, **ingest_options)
+
 def get_buyer_preferences():
     """
     Returns a hard-coded set of buyer preferences as a single narrative string.
@@ -89,13 +187,8 @@ def get_buyer_preferences():
     print(profile)
     return profile
 
-def create_personalization_chain(llm):
-    """
-    Creates a LangChain chain to generate personalized property descriptions
-    based on buyer preferences and listing data.
-    Update this template as needed to refine the personalization approach.
-    """
-    template = """
+# Update this template as needed to refine the personalization approach.
+PERSONALIZATION_TEMPLATE = """
     You are an expert real estate copywriter at 'Future Homes Realty'.
     Your task is to rewrite a property listing to personally resonate with a specific buyer.
 
@@ -116,60 +209,190 @@ def create_personalization_chain(llm):
     Write a new, personalized "HomeMatch" description for this buyer (approx 3-4 paragraphs).
     Start by directly addressing them (e.g., "Based on what you're looking for...") and show how this specific property fits.
     """
+
+def create_personalization_chain(llm, template=PERSONALIZATION_TEMPLATE, callbacks=None):
+    """
+    Creates a LangChain chain to generate personalized property descriptions
+    based on buyer preferences and listing data; `callbacks` run on every call.
+    """
     prompt = ChatPromptTemplate.from_template(template)
     chain = prompt | llm | StrOutputParser()
+    if callbacks:
+        chain = chain.with_config(callbacks=callbacks)
     return chain
 
+def print_match_header(i, md):
+    print(f"\n======= MATCH {i+1}: {md['neighborhood']} =======")
+    print(f"Price: ${md['price']:,} | {md['bedrooms']} Bed | {md['bathrooms']} Bath")
+    print("---")
+    print("✨ Your Personalized 'HomeMatch' Description:")
+
+def print_match_footer(md):
+    print("--------------------------------------------------")
+    print("(For reference, Original Description:)")
+    print(f"({md['full_description']})")
+    print(f"==================================================")
+
+def print_match(i, md, personalized_description):
+    print_match_header(i, md)
+    print(personalized_description)
+    print_match_footer(md)
+
+async def print_personalized_matches(chain, buyer_profile, docs, limiter, concurrency=4, retries=3,
+                                     cache=None, cache_key=None):
+    async for i, doc, description in personalize_in_rank_order(chain, buyer_profile, docs, limiter,
+                                                                 concurrency, retries, cache, cache_key):
+        print_match(i, doc.metadata, description)
+
+async def print_streamed_matches(chain, buyer_profile, docs, limiter, concurrency=4, retries=3,
+                                 cache=None, cache_key=None):
+    """Print each match's description token by token as it streams, then the per-listing timings."""
+    timings = []
+    current = None
+    async for i, doc, chunk in stream_in_rank_order(chain, buyer_profile, docs, limiter, timings,
+                                                    concurrency, retries, cache, cache_key):
+        if i != current:
+            print_match_header(i, doc.metadata)
+            current = i
+        if chunk is None:
+            print()
+            print_match_footer(doc.metadata)
+        else:
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+    print_generation_timings(timings)
+    return timings
+
+def write_metrics(metrics, embeddings, settings):
+    """Print the stage summary and write the trace and metrics files (an empty path skips one)."""
+    metrics.add("embedding_cache_hits", embeddings.hits)
+    metrics.add("embedding_cache_misses", embeddings.misses)
+    print(metrics.summary(["load_listings", "vector_db", "embedding_request", "chroma_write", "retrieval",
+                           "batch_matching", "batch_embed", "batch_query", "personalization", "llm_call"]))
+    c = metrics.counters
+    print(f"LLM: {c['llm_calls']:g} calls, {c['llm_prompt_tokens']:g} prompt + "
+          f"{c['llm_completion_tokens']:g} completion tokens | Embeddings: {c['embedding_calls']:g} calls, "
+          f"{c['embedding_tokens']:g} tokens")
+    if settings.trace_path:
+        metrics.write_trace(settings.trace_path)
+        print(f"Trace written to {settings.trace_path}")
+    if settings.metrics_path:
+        metrics.write_prometheus(settings.metrics_path)
+        print(f"Metrics written to {settings.metrics_path}")
+
 def main():
+    ap = argparse.ArgumentParser(description="HomeMatch: vector retrieval and LLM personalization of listings")
+    ap.add_argument("--batch-profiles", default=None,
+                    help="JSONL file of buyer profiles to match in batch mode (no personalization)")
+    ap.add_argument("--batch-output", default=DEFAULT_BATCH_OUTPUT, help="JSONL file for batch-mode results")
+    ap.add_argument("--chunk-size", type=int, default=BATCH_CHUNK,
+                    help="Profiles per embedding request and Chroma query in batch mode")
+    args = ap.parse_args()
+
     print("🚀 Starting 'HomeMatch' Application...")
     if not load_environment():
         return
+    try:
+        settings = AppSettings.from_env()
+    except ValueError as e:
+        print(e)
+        return
+    if args.batch_profiles and settings.retrieval != "vector":
+        print("Batch mode matches against the vector database; unset HOMEMATCH_RETRIEVAL or set it to vector.")
+        return
 
-    chat_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-    embed_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    # Stage timings, API call counts and tokens; written to a JSON trace and a Prometheus text dump.
+    metrics = PipelineMetrics()
+    temperature = 0.5
+    # Retries are handled by retry_async with backoff, alongside the rate limiter.
+    # stream_usage asks the API to report token usage for streamed responses too.
+    llm = ChatOpenAI(model=settings.chat_model, temperature=temperature, max_retries=0, stream_usage=True)
+    # Vectors are cached by (model, text hash), so re-running on unchanged listings makes no embedding calls.
+    # The instrumented layer sits below the cache, so it only sees real API requests; the client sends each
+    # packed ingest batch as one request and, like the LLM, leaves retries to retry_async.
+    embed_model = settings.embed_model
+    api_embeddings = InstrumentedEmbeddings(embedding_client(embed_model), metrics, token_counter(embed_model))
+    embeddings = CachedEmbeddings(api_embeddings, embed_model, settings.embedding_cache)
 
-    llm = ChatOpenAI(model=chat_model, temperature=0.5)
-    embeddings = OpenAIEmbeddings(model=embed_model)
+    retrieval = settings.retrieval
+    if retrieval == "hybrid":
+        # Hybrid retrieval embeds candidates on demand, so there is no vector database to sync.
+        with metrics.stage("load_listings"):
+            snapshot = load_lexical_index(settings.dedup)
+        if snapshot is None:
+            return
+        store = snapshot.store
+    else:
+        with metrics.stage("load_listings"):
+            documents = load_and_prepare_listings(settings.dedup)
+        if documents is None:
+            return
+        store = documents.store
+        vectorstore = open_vector_database(documents, embeddings, settings, metrics)
+        print(embeddings.stats())
+    metrics.add("listings_loaded", len(store))
 
-    documents = load_and_prepare_listings()
-    if documents is None:
-        return
+    top_k, ranges = settings.top_k, settings.ranges
+    candidates = store.numeric_index.filter_rows(ranges)
+    n_matching = None if candidates is None else len(candidates)
 
-    vectorstore = setup_vector_database(documents, embeddings, reset=True)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+    if args.batch_profiles:
+        print(f"\n--- Batch Matching {args.batch_profiles} ---")
+        with metrics.stage("batch_matching"):
+            batch_stats = run_online_batch(vectorstore, embeddings, args.batch_profiles, args.batch_output, top_k,
+                                           args.chunk_size, ranges, n_matching, metrics)
+        print(batch_stats.summary(args.batch_output))
+        write_metrics(metrics, embeddings, settings)
+        return
 
     buyer_profile = get_buyer_preferences()
 
     print("\n--- Performing Semantic Search (Step 5) ---")
-    retrieved_docs = retriever.invoke(buyer_profile)
+    with metrics.stage("retrieval", k=top_k, mode=retrieval):
+        if retrieval == "hybrid":
+            # TF-IDF picks the candidates among listings passing the filters; embeddings rerank them.
+            retrieved_docs, hybrid_stats = hybrid_search(
+                snapshot, embeddings, buyer_profile, top_k, settings.hybrid_candidates, candidates)
+        else:
+            # Filters go into the Chroma where clause; the store's count of matching listings sizes the over-fetch.
+            retrieved_docs, filter_stats = filtered_search(
+                vectorstore, embeddings, buyer_profile, top_k, ranges, n_matching=n_matching)
+    metrics.add("listings_retrieved", len(retrieved_docs))
+    if retrieval == "hybrid":
+        print(hybrid_stats.summary())
+        if candidates is not None:
+            print(f"{len(candidates)} of {len(store)} listings match the filters.")
+        print(embeddings.stats())
+    else:
+        print(filter_stats.summary(len(store)))
     print(f"Found {len(retrieved_docs)} matching listings.")
 
     print("\n--- Generating Personalized Descriptions (Step 6) ---")
-    personalization_chain = create_personalization_chain(llm)
-
-    for i, doc in enumerate(retrieved_docs):
-        md = doc.metadata
-        chain_input = {
-            "buyer_preferences": buyer_profile,
-            "neighborhood": md['neighborhood'],
-            "price": md['price'],
-            "bedrooms": md['bedrooms'],
-            "bathrooms": md['bathrooms'],
-            "house_size_sqft": md['house_size_sqft'],
-            "original_description": md['full_description'],
-            "neighborhood_description": md['neighborhood_description']
-        }
-        personalized_description = personalization_chain.invoke(chain_input)
-
-        print(f"\n======= MATCH {i+1}: {md['neighborhood']} =======")
-        print(f"Price: ${md['price']:,} | {md['bedrooms']} Bed | {md['bathrooms']} Bath")
-        print("---")
-        print("✨ Your Personalized 'HomeMatch' Description:")
-        print(personalized_description)
-        print("--------------------------------------------------")
-        print("(For reference, Original Description:)")
-        print(f"({md['full_description']})")
-        print(f"==================================================")
+    personalization_chain = create_personalization_chain(
+        llm, callbacks=[UsageCallback(metrics, token_counter(settings.chat_model))])
+
+    # Descriptions are cached by model, temperature, template, normalized profile and listing content.
+    cache = ResponseCache(settings.response_cache, settings.response_ttl, settings.response_cache_size
+                          ) if settings.response_ttl > 0 else None
+
+    def cache_key(doc):
+        listing_hash = doc.metadata.get("content_hash") or document_hash(doc)
+        return response_key(settings.chat_model, temperature, PERSONALIZATION_TEMPLATE, buyer_profile,
+                            doc.metadata["id"], listing_hash)
+
+    limiter = AsyncRateLimiter(settings.rpm, settings.tpm)
+    # HOMEMATCH_STREAM=1 prints tokens as they arrive and reports per-listing latencies.
+    with metrics.stage("personalization"):
+        asyncio.run((print_streamed_matches if settings.stream else print_personalized_matches)(
+            personalization_chain, buyer_profile, retrieved_docs, limiter,
+            concurrency=settings.concurrency, retries=settings.max_retries,
+            cache=cache, cache_key=cache_key,
+        ))
+    if cache is not None:
+        print(cache.stats())
+        metrics.add("response_cache_hits", cache.hits)
+        metrics.add("response_cache_misses", cache.misses)
+    write_metrics(metrics, embeddings, settings)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,82 @@
+"""Batch online matching: one embedding request and one Chroma query per chunk of buyer profiles."""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from homematch_filtered import FilterStats, Ranges, chroma_where, count_matching, search_by_vector
+from homematch_offline import iter_profile_chunks
+
+DEFAULT_BATCH_OUTPUT = "online_matches.jsonl"
+BATCH_CHUNK = 256  # profiles per embedding request and per Chroma query
+
+@dataclass
+class BatchStats:
+    profiles: int = 0
+    chunks: int = 0
+    refetched: int = 0  # profiles re-run individually because the batched query came back short
+    seconds: float = 0.0
+
+    def summary(self, output_path: str) -> str:
+        rate = self.profiles / self.seconds if self.seconds else 0.0
+        refetched = f", {self.refetched} re-run with over-fetch" if self.refetched else ""
+        return (f"Matched {self.profiles} profiles in {self.chunks} chunks in {self.seconds:.1f}s "
+                f"({rate:.0f} profiles/s{refetched}); results written to {output_path}.")
+
+def _match_record(profile_id: str, found: List[Tuple[dict, float]]) -> str:
+    matches = [{"listing_id": md["id"], "distance": round(float(d), 6)} for md, d in found]
+    return json.dumps({"id": profile_id, "matches": matches})
+
+def run_online_batch(vectorstore, embeddings, profiles_path: str, output_path: str, k: int,
+                     chunk_size: int = BATCH_CHUNK, ranges: Optional[Ranges] = None,
+                     n_matching: Optional[int] = None, metrics=None) -> BatchStats:
+    """
+    Match every profile in `profiles_path` and write one JSONL line of matches per profile.
+    `n_matching` is the number of listings passing `ranges`, if known.
+    """
+    stats = BatchStats()
+    started = time.perf_counter()
+    collection = vectorstore._collection
+    where = chroma_where(ranges or {})
+    if n_matching is None:
+        n_matching = collection.count() if where is None else count_matching(collection, where)
+    want = min(k, n_matching)
+
+    def span(name: str, chunk):
+        return metrics.stage(name, profiles=len(chunk)) if metrics is not None else nullcontext()
+
+    def embed(chunk):
+        with span("batch_embed", chunk):
+            return chunk, embeddings.embed_documents([text for _, text in chunk])
+
+    chunks = iter_profile_chunks(profiles_path, chunk_size)
+    with ThreadPoolExecutor(max_workers=1) as pool, open(output_path, "w", encoding="utf-8") as out:
+        first = next(chunks, None)
+        future = pool.submit(embed, first) if first else None
+        while future is not None:
+            chunk, vectors = future.result()
+            following = next(chunks, None)
+            future = pool.submit(embed, following) if following else None
+
+            lines = []
+            with span("batch_query", chunk):
+                if want > 0:
+                    result = collection.query(query_embeddings=vectors, n_results=want, where=where,
+                                              include=["metadatas", "distances"])
+                for row, (profile_id, _) in enumerate(chunk):
+                    found = list(zip(result["metadatas"][row], result["distances"][row])) if want > 0 else []
+                    if len(found) < want and where is not None:
+                        stats.refetched += 1
+                        found = [(doc.metadata, d) for doc, d in
+                                 search_by_vector(collection, vectors[row], k, where, n_matching, FilterStats())]
+                    lines.append(_match_record(profile_id, found))
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+            stats.profiles += len(chunk)
+            stats.chunks += 1
+    stats.seconds = time.perf_counter() - started
+    if metrics is not None:
+        metrics.add("batch_profiles", stats.profiles)
+    return stats
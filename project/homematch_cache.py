@@ -0,0 +1,192 @@
+"""Persistent SQLite caches of embedding vectors and generated descriptions for the HomeMatch online app."""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = "./embedding_cache.sqlite3"
+_SELECT_BATCH = 500  # keys per SELECT (stays under SQLite's bound-parameter limit)
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that answers repeated texts from a SQLite cache and counts hits and misses."""
+    def __init__(self, embeddings: Embeddings, model: str, path: str = DEFAULT_CACHE_PATH):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._db.commit()
+
+    def _lookup(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for start in range(0, len(hashes), _SELECT_BATCH):
+            batch = hashes[start:start + _SELECT_BATCH]
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                (self.model, *batch),
+            )
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float64).tolist()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [(self.model, h, np.asarray(v, dtype=np.float64).tobytes()) for h, v in vectors.items()],
+        )
+        self._db.commit()
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vector per text, or None where it has not been embedded yet (not counted as hits or misses)."""
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            found = self._lookup(list(dict.fromkeys(hashes)))
+        return [found.get(h) for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            found = self._lookup(list(dict.fromkeys(hashes)))
+        # Each distinct missing text is embedded once, however often it repeats in `texts`.
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            with self._lock:
+                self._store(computed)
+            found.update(computed)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        h = text_hash(text)
+        with self._lock:
+            found = self._lookup([h]).get(h)
+            if found is not None:
+                self.hits += 1
+                return found
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._store({h: vector})
+            self.misses += 1
+        return vector
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = f" ({self.hits / total:.0%} hit rate)" if total else ""
+        return f"Embedding cache: {self.hits} hits, {self.misses} misses{rate} [{self.path}]"
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def load_cached_vectors(path: str, model: str, texts: Iterable[str], limit: Optional[int] = None) -> np.ndarray:
+    """(n, dim) array of the vectors cached for `model` for those `texts` that have one, in text order."""
+    hashes = list(dict.fromkeys(text_hash(t) for t in texts))
+    found: Dict[str, bytes] = {}
+    db = sqlite3.connect(path)
+    try:
+        for start in range(0, len(hashes), _SELECT_BATCH):
+            batch = hashes[start:start + _SELECT_BATCH]
+            found.update(db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                (model, *batch)))
+    finally:
+        db.close()
+    blobs = [found[h] for h in hashes if h in found][:limit]
+    if not blobs:
+        return np.zeros((0, 0))
+    return np.stack([np.frombuffer(blob, dtype=np.float64) for blob in blobs])
+
+DEFAULT_RESPONSE_CACHE_PATH = "./response_cache.sqlite3"
+DEFAULT_RESPONSE_TTL = 7 * 24 * 3600  # seconds
+DEFAULT_RESPONSE_ENTRIES = 10000
+
+def normalize_profile(profile: str) -> str:
+    """Case- and whitespace-insensitive form of a buyer profile, for cache keys."""
+    return " ".join(profile.lower().split())
+
+def response_key(model: str, temperature: float, template: str, buyer_profile: str,
+                 listing_id: str, listing_hash: str) -> str:
+    """Cache key for one generated description; any change to the inputs gives a new key."""
+    parts = [model, repr(float(temperature)), text_hash(template), normalize_profile(buyer_profile),
+             listing_id, listing_hash]
+    return text_hash("\x1f".join(parts))
+
+class ResponseCache:
+    """Disk-backed cache of LLM responses with a TTL and LRU eviction beyond `max_entries`."""
+    def __init__(self, path: str = DEFAULT_RESPONSE_CACHE_PATH, ttl: float = DEFAULT_RESPONSE_TTL,
+                 max_entries: int = DEFAULT_RESPONSE_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,))
+                self.evicted += excess
+            self._db.commit()
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = f" ({self.hits / total:.0%} hit rate)" if total else ""
+        return (f"Response cache: {self.hits} hits, {self.misses} misses{rate}, "
+                f"{self.expired} expired, {self.evicted} evicted [{self.path}]")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
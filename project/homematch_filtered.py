@@ -0,0 +1,108 @@
+"""Metadata-filtered vector retrieval with adaptive over-fetch for the HomeMatch online app."""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from homematch_hnsw import distances, stored_settings
+
+# Filter names (min_/max_ prefixed) per store column, as in the offline server.
+EXACT_SEARCH_LIMIT = 2000  # rank matching listings exactly when there are at most this many
+OVERFETCH_GROWTH = 4       # n_results multiplier per retry of a short filtered query
+
+Ranges = Dict[str, Tuple[Optional[float], Optional[float]]]
+
+@dataclass
+class FilterStats:
+    matching: Optional[int] = None  # listings passing the filter (None = no filter)
+    queries: int = 0                # vector queries issued
+    fetched: int = 0                # results requested by the last query
+    exact: bool = False             # ranked exactly over the matching listings
+
+    def summary(self, total: int) -> str:
+        if self.matching is None:
+            return "No listing filters applied."
+        queries = f"{self.queries} filtered HNSW quer{'y' if self.queries == 1 else 'ies'}"
+        how = "ranked exactly" if self.exact else f"{queries}, final n_results={self.fetched}"
+        return f"{self.matching} of {total} listings match the filters ({how})."
+
+def chroma_where(ranges: Ranges) -> Optional[dict]:
+    """Chroma `where` clause for inclusive (lo, hi) ranges per column, or None when unconstrained."""
+    clauses = []
+    for name, (lo, hi) in ranges.items():
+        if lo is not None:
+            clauses.append({name: {"$gte": lo}})
+        if hi is not None:
+            clauses.append({name: {"$lte": hi}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _exact_search(collection, where: dict, query: List[float], k: int) -> List[Tuple[Document, float]]:
+    found = collection.get(where=where, include=["embeddings", "documents", "metadatas"])
+    if not len(found["ids"]):
+        return []
+    space = stored_settings(collection.metadata)["space"]
+    dist = distances(space, np.asarray(found["embeddings"], dtype=np.float64), np.asarray(query, dtype=np.float64))
+    order = np.argsort(dist, kind="stable")[:k]
+    return [(Document(page_content=found["documents"][i], metadata=found["metadatas"][i]), float(dist[i]))
+            for i in order]
+
+def search_by_vector(collection, query_vector: List[float], k: int, where: dict, n_matching: int,
+                     stats: FilterStats, exact_limit: int = EXACT_SEARCH_LIMIT,
+                     growth: int = OVERFETCH_GROWTH) -> List[Tuple[Document, float]]:
+    """
+    The min(k, n_matching) (document, distance) pairs nearest to `query_vector`
+    among the `n_matching` listings passing `where`, with adaptive over-fetch.
+    """
+    stats.matching = n_matching
+    want = min(k, n_matching)
+    if want <= 0:
+        return []
+    if n_matching > exact_limit:
+        fetch = want
+        while True:
+            result = collection.query(query_embeddings=[query_vector], n_results=fetch, where=where,
+                                      include=["documents", "metadatas", "distances"])
+            stats.queries += 1
+            stats.fetched = fetch
+            ids = result["ids"][0]
+            if len(ids) >= want:
+                return [(Document(page_content=text, metadata=md), float(d)) for text, md, d in
+                        zip(result["documents"][0][:want], result["metadatas"][0][:want],
+                            result["distances"][0][:want])]
+            if fetch >= n_matching:
+                break
+            fetch = min(n_matching, fetch * growth)
+    # Few enough matches (or HNSW still came back short): rank the filtered subset exactly.
+    stats.exact = True
+    return _exact_search(collection, where, query_vector, want)
+
+def count_matching(collection, where: dict) -> int:
+    """Listings passing `where`, from a metadata-only query."""
+    return len(collection.get(where=where, include=[])["ids"])
+
+def filtered_search(vectorstore, embeddings, query: str, k: int, ranges: Ranges,
+                    n_matching: Optional[int] = None, exact_limit: int = EXACT_SEARCH_LIMIT,
+                    growth: int = OVERFETCH_GROWTH) -> Tuple[List[Document], FilterStats]:
+    """
+    Top-k listings for `query` among those satisfying `ranges`, nearest first.
+    `n_matching` is the number of listings passing the filter, if known.
+    """
+    stats = FilterStats()
+    where = chroma_where(ranges)
+    if where is None:
+        stats.queries = 1
+        stats.fetched = k
+        return vectorstore.similarity_search(query, k=k), stats
+
+    collection = vectorstore._collection
+    if n_matching is None:
+        n_matching = count_matching(collection, where)
+    if min(k, n_matching) <= 0:
+        stats.matching = n_matching
+        return [], stats
+    found = search_by_vector(collection, embeddings.embed_query(query), k, where, n_matching, stats,
+                             exact_limit, growth)
+    return [doc for doc, _ in found], stats
@@ -0,0 +1,43 @@
+"""HNSW settings (space, M, construction_ef, search_ef) of the HomeMatch Chroma collection."""
+from typing import Mapping, Optional
+
+import numpy as np
+
+HNSW_SPACES = ("l2", "cosine", "ip")
+# chromadb's own defaults, so collections created before these settings existed match them.
+DEFAULT_HNSW = {"space": "l2", "M": 16, "construction_ef": 100, "search_ef": 10}
+_METADATA_KEYS = {"space": "hnsw:space", "M": "hnsw:M", "construction_ef": "hnsw:construction_ef",
+                  "search_ef": "hnsw:search_ef"}
+
+def hnsw_settings(space: Optional[str] = None, M: Optional[int] = None, construction_ef: Optional[int] = None,
+                  search_ef: Optional[int] = None) -> dict:
+    """Validated HNSW settings; parameters left as None take the chromadb defaults."""
+    settings = dict(DEFAULT_HNSW)
+    for name, value in (("space", space), ("M", M), ("construction_ef", construction_ef), ("search_ef", search_ef)):
+        if value is not None:
+            settings[name] = value
+    if settings["space"] not in HNSW_SPACES:
+        raise ValueError(f"HNSW space must be one of {', '.join(HNSW_SPACES)}, got {settings['space']!r}")
+    for name in ("M", "construction_ef", "search_ef"):
+        settings[name] = int(settings[name])
+        if settings[name] < 1:
+            raise ValueError(f"HNSW {name} must be a positive integer")
+    return settings
+
+def collection_metadata(settings: dict) -> dict:
+    """Chroma collection metadata carrying `settings`."""
+    return {_METADATA_KEYS[name]: settings[name] for name in DEFAULT_HNSW}
+
+def stored_settings(metadata: Optional[Mapping]) -> dict:
+    """HNSW settings a collection was created with (chromadb defaults for keys it does not carry)."""
+    metadata = metadata or {}
+    return {name: metadata.get(key, DEFAULT_HNSW[name]) for name, key in _METADATA_KEYS.items()}
+
+def distances(space: str, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Distance from `query` to each row of `vectors` under an HNSW space, as Chroma reports it."""
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+        return 1.0 - vectors.dot(query) / np.where(norms > 0, norms, 1.0)
+    if space == "ip":
+        return 1.0 - vectors.dot(query)
+    return ((vectors - query) ** 2).sum(axis=1)
@@ -0,0 +1,58 @@
+"""Two-stage hybrid retrieval: TF-IDF candidates reranked by (cached) embeddings."""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from homematch_index import DEFAULT_INDEX_DIR, IndexSnapshot, load_listing_store, load_or_build_index
+from homematch_retrieval import query_vector, select_top_k, top_k_for_rows, top_k_from_scores
+
+HYBRID_CANDIDATES = 50  # lexical candidates reranked by embeddings per query
+
+@dataclass
+class HybridStats:
+    candidates: int = 0  # listings returned by the lexical stage
+    embedded: int = 0    # candidates the embeddings API was called for (the rest were cached)
+
+    def summary(self) -> str:
+        return (f"Hybrid retrieval: reranked {self.candidates} TF-IDF candidates by embedding "
+                f"({self.embedded} newly embedded, {self.candidates - self.embedded} from cache).")
+
+def open_lexical_index(listings_path: str, dedup: Optional[dict] = None,
+                       index_dir: str = DEFAULT_INDEX_DIR) -> IndexSnapshot:
+    """TF-IDF snapshot of the listings file, shared with (and built like) the offline pipeline."""
+    return load_or_build_index(listings_path, lambda: load_listing_store(listings_path, dedup, index_dir),
+                               index_dir=index_dir, dedup=dedup)
+
+def lexical_candidates(snapshot: IndexSnapshot, query: str, n: int,
+                       rows: Optional[np.ndarray] = None) -> List[int]:
+    """Top-n rows by TF-IDF cosine; `rows` (sorted row ids from a filter) restricts the search."""
+    q = query_vector(snapshot.vectorizer, query)
+    if rows is not None:
+        top = top_k_for_rows(snapshot.matrix, q, rows, n)
+    else:
+        top = top_k_from_scores(snapshot.matrix.dot(q), n)
+    return [doc for doc, _ in top]
+
+def hybrid_search(snapshot: IndexSnapshot, embeddings, query: str, k: int, n_candidates: int = HYBRID_CANDIDATES,
+                  rows: Optional[np.ndarray] = None) -> Tuple[List[Document], HybridStats]:
+    """
+    Top-k listings for `query`: TF-IDF candidates reranked by embedding cosine
+    similarity (ties keep the lexical order).
+    """
+    store = snapshot.store
+    candidates = lexical_candidates(snapshot, query, max(k, n_candidates), rows)
+    stats = HybridStats(candidates=len(candidates))
+    if not candidates:
+        return [], stats
+
+    docs = [Document(page_content=store.page_content(r), metadata=dict(store[r].metadata)) for r in candidates]
+    misses = getattr(embeddings, "misses", 0)
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float64)
+    stats.embedded = getattr(embeddings, "misses", 0) - misses
+    q = np.asarray(embeddings.embed_query(query), dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(q)
+    scores = vectors.dot(q) / np.where(norms > 0, norms, 1.0)
+    order, _ = select_top_k(np.arange(len(docs)), scores, k)
+    return [docs[i] for i in order], stats
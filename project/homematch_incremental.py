@@ -0,0 +1,339 @@
+"""Incremental add/remove for the offline HomeMatch TF-IDF index, with a delta log and idf-drift compaction."""
+import json
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from feature_matcher import feature_masks
+from homematch_index import IndexSnapshot, fit_tfidf, index_key, save_snapshot
+from homematch_retrieval import streaming_top_k
+from listing_store import ListingStore
+
+DEFAULT_DRIFT_TOLERANCE = 0.05
+MAX_DELTA_SEGMENTS = 16
+
+@dataclass
+class Segment:
+    offset: int                 # first row of the segment
+    matrix: sparse.csr_matrix   # L2-normalized TF-IDF rows
+    cols: Optional[np.ndarray]  # columns the rows were weighted on (None = all of [0, n_cols))
+    idf: np.ndarray             # idf of those columns when the rows were weighted
+
+def smooth_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """TfidfVectorizer's default idf: ln((1 + n) / (1 + df)) + 1."""
+    return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+def delta_log_path(listings_path: str, index_dir: str) -> str:
+    return os.path.join(index_dir, f"{index_key(listings_path)}.delta.jsonl")
+
+def _log_fingerprint(path: str) -> Optional[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        header = f.readline()
+    return json.loads(header).get("base_fingerprint") if header.strip() else None
+
+def read_delta_log(path: str, fingerprint: str) -> List[dict]:
+    """Operations recorded against the snapshot with `fingerprint`; a log for another version is ignored."""
+    if not os.path.exists(path):
+        return []
+    if _log_fingerprint(path) != fingerprint:
+        print(f"Ignoring delta log {path}: it was recorded against a different listings file.")
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f.readlines()[1:] if line.strip()]
+
+def append_delta_log(path: str, fingerprint: str, ops: List[dict]) -> None:
+    if os.path.exists(path) and _log_fingerprint(path) != fingerprint:
+        # Recorded against an older listings file: keep it for reference, start a new log.
+        os.replace(path, path + ".stale")
+    new_log = not os.path.exists(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        if new_log:
+            f.write(json.dumps({"base_fingerprint": fingerprint}) + "\n")
+        for op in ops:
+            f.write(json.dumps(op) + "\n")
+
+class IncrementalIndex:
+    """TF-IDF index over a ListingStore that supports appends and tombstones."""
+    def __init__(self, snapshot: IndexSnapshot, store: ListingStore,
+                 drift_tolerance: float = DEFAULT_DRIFT_TOLERANCE):
+        self.store = store
+        self.drift_tolerance = drift_tolerance
+        self._analyzer = snapshot.vectorizer.build_analyzer()
+        self._stop_words = snapshot.vectorizer.get_stop_words() or ()
+        self._lock = threading.RLock()
+        self._compaction: Optional[threading.Thread] = None
+        self._compacted = False
+        self._reset(snapshot.vectorizer.vocabulary_, snapshot.vectorizer.idf_, snapshot.matrix,
+                    snapshot.n_docs if snapshot.n_docs is not None else snapshot.matrix.shape[0])
+        self.features = np.asarray(snapshot.features, dtype=np.uint32)
+        self.deleted = np.zeros(snapshot.matrix.shape[0], dtype=bool)
+
+    def _reset(self, vocabulary: Dict[str, int], idf: np.ndarray, X, n_docs: int) -> None:
+        self.vocabulary = dict(vocabulary)
+        self.n_docs = int(n_docs)
+        df = np.rint((1.0 + n_docs) / np.exp(np.asarray(idf) - 1.0) - 1.0)
+        self._df = np.zeros(max(len(df), 1024))
+        self._df[:len(df)] = df
+        self.segments = [Segment(offset=0, matrix=X, cols=None, idf=np.asarray(idf))]
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._idf: Optional[np.ndarray] = None
+        self._matrix = None
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.vocabulary)
+
+    @property
+    def n_rows(self) -> int:
+        last = self.segments[-1]
+        return last.offset + last.matrix.shape[0]
+
+    def current_idf(self) -> np.ndarray:
+        with self._lock:
+            if self._idf is None:
+                self._idf = smooth_idf(self._df[:self.n_terms], self.n_docs)
+            return self._idf
+
+    def _term_counts(self, text: str, grow: bool) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        for term, tf in Counter(self._analyzer(text)).items():
+            col = self.vocabulary.get(term)
+            if col is None:
+                if not grow:
+                    continue
+                col = self.vocabulary[term] = len(self.vocabulary)
+                if col >= len(self._df):
+                    self._df = np.concatenate([self._df, np.zeros(len(self._df))])
+            counts[col] = tf
+        return counts
+
+    def _weighted_rows(self, row_counts: List[Dict[int, int]], idf: np.ndarray) -> sparse.csr_matrix:
+        indptr, indices, data = [0], [], []
+        for counts in row_counts:
+            cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * idf[cols]
+            norm = np.linalg.norm(weights)
+            order = np.argsort(cols)
+            indices.append(cols[order])
+            data.append(weights[order] / norm if norm else weights[order])
+            indptr.append(indptr[-1] + len(cols))
+        return sparse.csr_matrix(
+            (np.concatenate(data) if data else np.zeros(0),
+             np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+             np.asarray(indptr)),
+            shape=(len(row_counts), self.n_terms),
+        )
+
+    def _index_rows(self, rows: range) -> None:
+        """Count terms for new rows, update df/vocabulary and append them as a segment."""
+        row_counts = [self._term_counts(self.store.page_content(r), grow=True) for r in rows]
+        for counts in row_counts:
+            cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            self._df[cols] += 1
+        self.n_docs += len(row_counts)
+        self._invalidate()
+        idf = self.current_idf()
+        matrix = self._weighted_rows(row_counts, idf)
+        cols = np.unique(matrix.indices)
+        self.segments.append(Segment(offset=rows.start, matrix=matrix, cols=cols, idf=idf[cols]))
+        if len(self.segments) - 1 > MAX_DELTA_SEGMENTS:
+            self._merge_delta_segments()
+
+    def _merge_delta_segments(self) -> None:
+        deltas = self.segments[1:]
+        blocks = [sparse.csr_matrix((s.matrix.data, s.matrix.indices, s.matrix.indptr),
+                                    shape=(s.matrix.shape[0], self.n_terms)) for s in deltas]
+        self.segments = [self.segments[0], Segment(
+            offset=deltas[0].offset,
+            matrix=sparse.vstack(blocks, format='csr'),
+            cols=np.concatenate([s.cols for s in deltas]),
+            idf=np.concatenate([s.idf for s in deltas]),
+        )]
+
+    def _segment_row(self, row: int) -> Tuple[Segment, int]:
+        for seg in reversed(self.segments):
+            if row >= seg.offset:
+                return seg, row - seg.offset
+        raise IndexError(row)
+
+    def add_listings(self, listings: List[dict]) -> range:
+        """Append listings and index them; returns their row range."""
+        with self._lock:
+            rows = self.store.extend(listings)
+            if not len(rows):
+                return rows
+            new_features = feature_masks(self.store.feature_text(r) for r in rows)
+            self.features = np.concatenate([self.features, new_features])
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(rows), dtype=bool)])
+            self._index_rows(rows)
+            return rows
+
+    def remove_ids(self, listing_ids: Iterable[str]) -> int:
+        """Tombstone listings by id and drop their terms from df; returns how many were removed."""
+        removed = 0
+        with self._lock:
+            for listing_id in listing_ids:
+                row = self.store.row_of(listing_id)
+                if row is None or row >= self.n_rows or self.deleted[row]:
+                    continue
+                self._forget_row(row)
+                self.deleted[row] = True
+                removed += 1
+            if removed:
+                self._invalidate()
+        return removed
+
+    def _forget_row(self, row: int) -> None:
+        seg, local = self._segment_row(row)
+        cols = seg.matrix.indices[seg.matrix.indptr[local]:seg.matrix.indptr[local + 1]]
+        self._df[np.asarray(cols)] -= 1
+        self.n_docs -= 1
+
+    def replay(self, ops: List[dict], applied: int = 0) -> None:
+        """Re-apply delta-log operations on load; the first `applied` ones are already in the snapshot matrix."""
+        with self._lock:
+            pending: List[dict] = []
+            pending_folded = False
+            store_has_folded = len(self.store) >= self.n_rows
+
+            def flush():
+                if pending:
+                    if pending_folded:
+                        if not store_has_folded:
+                            self.store.extend(pending)
+                    else:
+                        self.add_listings(pending)
+                    pending.clear()
+
+            for i, op in enumerate(ops):
+                if op["op"] == "add":
+                    if pending and pending_folded != (i < applied):
+                        flush()
+                    pending_folded = i < applied
+                    pending.append(op["listing"])
+                elif op["op"] == "remove":
+                    flush()
+                    row = self.store.row_of(op["id"])
+                    if row is not None and row < self.n_rows and not self.deleted[row]:
+                        if i >= applied:
+                            self._forget_row(row)
+                        self.deleted[row] = True
+            flush()
+            self._invalidate()
+
+    def drift(self) -> float:
+        """Largest relative gap between the idf a stored row was weighted with and the current idf."""
+        with self._lock:
+            idf = self.current_idf()
+            worst = 0.0
+            for seg in self.segments:
+                now = idf[:len(seg.idf)] if seg.cols is None else idf[seg.cols]
+                if len(now):
+                    worst = max(worst, float(np.max(np.abs(now - seg.idf) / seg.idf)))
+            return worst
+
+    def live_rows(self) -> Optional[np.ndarray]:
+        """Sorted non-tombstoned rows, or None when nothing has been removed."""
+        if not self.deleted.any():
+            return None
+        return np.flatnonzero(~self.deleted)
+
+    def restrict(self, candidates: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Intersect pre-filter candidates with the live rows."""
+        live = self.live_rows()
+        if live is None:
+            return candidates
+        if candidates is None:
+            return live
+        return np.intersect1d(candidates, live, assume_unique=True)
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """Query vectors weighted with the current idf (vectorizer-compatible)."""
+        with self._lock:
+            idf = self.current_idf()
+            return self._weighted_rows([self._term_counts(t, grow=False) for t in texts], idf)
+
+    def as_matrix(self) -> sparse.csr_matrix:
+        """All segments as one CSR matrix over the current vocabulary (cached until the next change)."""
+        with self._lock:
+            if self._matrix is None:
+                if len(self.segments) == 1 and self.segments[0].matrix.shape[1] == self.n_terms:
+                    self._matrix = self.segments[0].matrix
+                else:
+                    self._matrix = sparse.vstack([
+                        sparse.csr_matrix((s.matrix.data, s.matrix.indices, s.matrix.indptr),
+                                          shape=(s.matrix.shape[0], self.n_terms))
+                        for s in self.segments
+                    ], format='csr')
+            return self._matrix
+
+    def search(self, query: str, k: int, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Exact top-k over the segments, skipping tombstoned rows."""
+        with self._lock:
+            q = np.asarray(self.transform([query]).toarray()).ravel()
+            shards = [(s.offset, s.matrix) for s in self.segments]
+            candidates = self.restrict(candidates)
+        return streaming_top_k(q, shards, k, candidates)
+
+    def needs_compaction(self) -> bool:
+        return self.drift() > self.drift_tolerance
+
+    def compact(self, background: bool = True) -> None:
+        """Refit TF-IDF on the live listings and swap it in; rows and ids keep their positions."""
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            if background:
+                self._compaction = threading.Thread(target=self._compact, name="homematch-compaction", daemon=True)
+                self._compaction.start()
+                return
+        self._compact()
+
+    def wait_for_compaction(self) -> bool:
+        """Block until a background compaction finishes; True if the index has been compacted."""
+        if self._compaction is not None:
+            self._compaction.join()
+        return self._compacted
+
+    def _compact(self) -> None:
+        with self._lock:
+            n_rows = self.n_rows
+            deleted_before = self.deleted[:n_rows].copy()
+        live = np.flatnonzero(~deleted_before)
+        vectorizer, X_live = fit_tfidf(self.store.page_content(r) for r in live)
+        # Scatter live rows back to their original positions; tombstoned rows stay empty.
+        placement = sparse.csr_matrix((np.ones(len(live)), (live, np.arange(len(live)))),
+                                      shape=(n_rows, len(live)))
+        X = (placement @ X_live).tocsr()
+        X.sort_indices()
+
+        with self._lock:
+            self._reset(vectorizer.vocabulary_, vectorizer.idf_, X, len(live))
+            # Catch up with changes made while the refit was running.
+            for row in np.flatnonzero(self.deleted[:n_rows] & ~deleted_before):
+                self._forget_row(int(row))
+            if len(self.store) > n_rows:
+                self._index_rows(range(n_rows, len(self.store)))
+                # Rows appended and removed again during the refit were forgotten
+                # against the old df; forget them against the new one too.
+                for row in np.flatnonzero(self.deleted[n_rows:]):
+                    self._forget_row(n_rows + int(row))
+            self._invalidate()
+            self._compacted = True
+
+    def save(self, path: str, fingerprint: str, delta_applied: int,
+             source: Optional[Tuple[int, int]] = None, dedup: Optional[dict] = None) -> None:
+        """Persist a compacted index (single segment) and its listing store as the snapshot at `path`."""
+        with self._lock:
+            if len(self.segments) != 1:
+                raise ValueError("Only a compacted index can be saved as a snapshot")
+            save_snapshot(path, self.vocabulary, self.current_idf(), self.segments[0].matrix,
+                          fingerprint, self.features, n_docs=self.n_docs, delta_applied=delta_applied,
+                          store=self.store, source=source, stop_words=self._stop_words, dedup=dedup)
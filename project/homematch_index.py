@@ -0,0 +1,229 @@
+"""Persisted, memory-mappable TF-IDF index snapshots for offline HomeMatch."""
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from feature_matcher import FEATURE_KEYWORDS, feature_masks
+from listing_store import ListingStore
+from tfidf_query import TOKEN_PATTERN, SnapshotVectorizer
+
+INDEX_FORMAT_VERSION = 5
+DEFAULT_INDEX_DIR = ".homematch_index"
+VECTORIZER_SETTINGS = {"ngram_range": (1, 2), "stop_words": "english", "min_df": 1}
+
+@dataclass
+class IndexSnapshot:
+    vectorizer: SnapshotVectorizer  # or a fitted TfidfVectorizer
+    matrix: sparse.csr_matrix
+    fingerprint: str
+    path: Optional[str] = None
+    features: Optional[np.ndarray] = None
+    n_docs: Optional[int] = None  # documents the idf was fitted on (excludes tombstoned rows)
+    delta_applied: int = 0  # delta-log operations already folded into the matrix
+    store: Optional[ListingStore] = None  # listings of every matrix row, memory-mapped
+    source: Optional[Tuple[int, int]] = None  # (size, mtime_ns) of the listings file when fingerprinted
+    dedup: Optional[dict] = None  # near-duplicate settings the listings were loaded with (None = all kept)
+
+def _settings_digest(settings: dict, dedup: Optional[dict] = None) -> str:
+    """Everything in the fingerprint except the listings file bytes."""
+    h = hashlib.sha256()
+    h.update(f"homematch-index-v{INDEX_FORMAT_VERSION}\n".encode("utf-8"))
+    h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    h.update(json.dumps(dedup, sort_keys=True).encode("utf-8"))
+    h.update(json.dumps(FEATURE_KEYWORDS).encode("utf-8"))
+    return h.hexdigest()
+
+def fingerprint_listings(listings_path: str, settings: dict = VECTORIZER_SETTINGS,
+                         dedup: Optional[dict] = None) -> str:
+    """Hash the listings file bytes together with the vectorizer, near-duplicate and feature settings."""
+    h = hashlib.sha256()
+    h.update(_settings_digest(settings, dedup).encode("utf-8"))
+    with open(listings_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def source_stat(listings_path: str) -> Tuple[int, int]:
+    st = os.stat(listings_path)
+    return st.st_size, st.st_mtime_ns
+
+def cached_fingerprint(listings_path: str, path: str, settings: dict = VECTORIZER_SETTINGS,
+                       dedup: Optional[dict] = None) -> str:
+    """The snapshot's recorded fingerprint if the file's size and mtime are unchanged; otherwise hash it again."""
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("settings_digest") == _settings_digest(settings, dedup)
+                and tuple(meta.get("source") or ()) == source_stat(listings_path)):
+            return meta["fingerprint"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return fingerprint_listings(listings_path, settings, dedup)
+
+def resolve_stop_words(settings: dict) -> List[str]:
+    stop_words = settings.get("stop_words")
+    if stop_words is None:
+        return []
+    if stop_words == "english":
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        return sorted(ENGLISH_STOP_WORDS)
+    return sorted(stop_words)
+
+def index_key(listings_path: str) -> str:
+    """File stem plus a short hash of the absolute path, so a/listings.json and b/listings.json do not collide."""
+    stem = os.path.splitext(os.path.basename(listings_path))[0]
+    digest = hashlib.sha256(os.path.abspath(listings_path).encode("utf-8")).hexdigest()[:12]
+    return f"{stem}-{digest}"
+
+def snapshot_path(listings_path: str, index_dir: str = DEFAULT_INDEX_DIR) -> str:
+    """Snapshot directory for a listings file (one snapshot per listings file)."""
+    return os.path.join(index_dir, index_key(listings_path))
+
+def dedup_cache_path(listings_path: str, index_dir: str = DEFAULT_INDEX_DIR) -> str:
+    return os.path.join(index_dir, f"{index_key(listings_path)}.dedup.npz")
+
+def load_listing_store(listings_path: str, dedup: Optional[dict] = None,
+                       index_dir: str = DEFAULT_INDEX_DIR) -> ListingStore:
+    """`ListingStore.load`, reusing the near-duplicate positions cached beside the snapshot for this file version."""
+    if dedup is None:
+        return ListingStore.load(listings_path)
+    fingerprint = cached_fingerprint(listings_path, snapshot_path(listings_path, index_dir), dedup=dedup)
+    path = dedup_cache_path(listings_path, index_dir)
+    try:
+        with np.load(path) as cached:
+            if str(cached["fingerprint"]) == fingerprint:
+                return ListingStore.load(listings_path, dedup, kept=cached["kept"])
+    except (OSError, ValueError, KeyError):
+        pass
+    store = ListingStore.load(listings_path, dedup)
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(tmp_path, fingerprint=np.array(fingerprint),
+             kept=store.ids if store.ids is not None else np.arange(len(store), dtype=np.int64))
+    os.replace(tmp_path, path)
+    return store
+
+def fit_tfidf(corpus: Iterable[str], settings: dict = VECTORIZER_SETTINGS):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(**settings)
+    X = vectorizer.fit_transform(corpus)
+    return vectorizer, X.tocsr()
+
+def save_snapshot(path: str, vocabulary: Dict[str, int], idf: np.ndarray, X, fingerprint: str,
+                  features: np.ndarray, settings: dict = VECTORIZER_SETTINGS,
+                  n_docs: Optional[int] = None, delta_applied: int = 0,
+                  store: Optional[ListingStore] = None, source: Optional[Tuple[int, int]] = None,
+                  stop_words: Optional[Iterable[str]] = None, dedup: Optional[dict] = None) -> None:
+    """Write the snapshot to a temporary directory and swap it into place."""
+    X = sparse.csr_matrix(X)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    terms = [""] * len(vocabulary)
+    for term, col in vocabulary.items():
+        terms[col] = term
+    with open(os.path.join(tmp_path, "vocabulary.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(terms))
+    with open(os.path.join(tmp_path, "stop_words.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(resolve_stop_words(settings) if stop_words is None else sorted(stop_words)))
+    np.save(os.path.join(tmp_path, "idf.npy"), idf)
+    np.save(os.path.join(tmp_path, "data.npy"), X.data)
+    np.save(os.path.join(tmp_path, "indices.npy"), X.indices)
+    np.save(os.path.join(tmp_path, "indptr.npy"), X.indptr)
+    np.save(os.path.join(tmp_path, "features.npy"), features)
+    if store is not None:
+        store.save(os.path.join(tmp_path, "store"))
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "settings": settings,
+        "settings_digest": _settings_digest(settings, dedup),
+        "dedup": dedup,
+        "token_pattern": TOKEN_PATTERN,
+        "source": list(source) if source is not None else None,
+        "shape": list(X.shape),
+        "n_docs": X.shape[0] if n_docs is None else int(n_docs),
+        "delta_applied": int(delta_applied),
+    }
+    # meta.json is written last: a snapshot without it is treated as missing.
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.isdir(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    if os.path.isdir(old_path):
+        shutil.rmtree(old_path)
+
+def load_snapshot(path: str, fingerprint: Optional[str] = None, mmap: bool = True) -> Optional[IndexSnapshot]:
+    """Load a snapshot, or return None if it is missing, stale or unreadable."""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+
+        mode = "r" if mmap else None
+        data = np.load(os.path.join(path, "data.npy"), mmap_mode=mode)
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode=mode)
+        indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode=mode)
+        idf = np.load(os.path.join(path, "idf.npy"))
+        features = np.load(os.path.join(path, "features.npy"), mmap_mode=mode)
+        with open(os.path.join(path, "vocabulary.txt"), "r", encoding="utf-8") as f:
+            terms = f.read().split("\n")
+        with open(os.path.join(path, "stop_words.txt"), "r", encoding="utf-8") as f:
+            stop_words = [w for w in f.read().split("\n") if w]
+        store_path = os.path.join(path, "store")
+        store = ListingStore.open(store_path, mmap_mode=mmap) if os.path.isdir(store_path) else None
+    except (OSError, ValueError):
+        return None
+
+    X = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+    vectorizer = SnapshotVectorizer(
+        {t: i for i, t in enumerate(terms)}, idf, meta["settings"]["ngram_range"], stop_words,
+        token_pattern=meta.get("token_pattern", TOKEN_PATTERN),
+    )
+    return IndexSnapshot(vectorizer=vectorizer, matrix=X, fingerprint=meta["fingerprint"],
+                         path=path, features=features, n_docs=meta.get("n_docs", X.shape[0]),
+                         delta_applied=meta.get("delta_applied", 0), store=store,
+                         source=tuple(meta["source"]) if meta.get("source") else None, dedup=meta.get("dedup"))
+
+def load_or_build_index(listings_path: str, store_fn: Callable[[], ListingStore],
+                        index_dir: str = DEFAULT_INDEX_DIR, rebuild: bool = False,
+                        dedup: Optional[dict] = None) -> IndexSnapshot:
+    """
+    Return the snapshot for `listings_path`, refitting it only when missing or stale.
+    `store_fn` loads the listings and is only called when the index has to be built.
+    """
+    path = snapshot_path(listings_path, index_dir)
+    source = source_stat(listings_path)
+    fingerprint = cached_fingerprint(listings_path, path, dedup=dedup)
+    if not rebuild:
+        snapshot = load_snapshot(path, fingerprint)
+        if snapshot is not None and snapshot.store is not None:
+            print(f"Loaded TF-IDF index snapshot from {path}.")
+            return snapshot
+
+    store = store_fn()
+    vectorizer, X = fit_tfidf(store.page_contents())
+    features = feature_masks(store.feature_texts())
+    save_snapshot(path, vectorizer.vocabulary_, vectorizer.idf_, X, fingerprint, features,
+                  store=store, source=source, stop_words=vectorizer.get_stop_words() or (), dedup=dedup)
+    print(f"Built TF-IDF index snapshot at {path}.")
+    return load_snapshot(path, fingerprint) or IndexSnapshot(vectorizer, X, fingerprint, path, features,
+                                                             X.shape[0], store=store, source=source, dedup=dedup)
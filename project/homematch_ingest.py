@@ -0,0 +1,171 @@
+"""Token-aware, concurrent embedding ingestion for the HomeMatch Chroma collection."""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple, Type
+
+from langchain_core.embeddings import Embeddings
+
+from rate_limit import AsyncRateLimiter, retry_async
+
+MAX_REQUEST_TOKENS = 100_000  # tokens per embedding request (the API allows up to 300k)
+MAX_REQUEST_INPUTS = 2048     # inputs per embedding request (API limit)
+WRITE_BATCH = 5000            # vectors per Chroma upsert (below chromadb's max batch size)
+
+# (id, text, metadata)
+IngestItem = Tuple[str, str, dict]
+
+@dataclass
+class IngestStats:
+    texts: int = 0
+    cached: int = 0     # vectors answered by the embedding cache before packing
+    requests: int = 0
+    tokens: int = 0
+    written: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.written / self.seconds if self.seconds else 0.0
+        return (f"Embedded {self.texts} listings ({self.cached} from cache) in {self.requests} requests, "
+                f"{self.tokens} tokens; wrote {self.written} vectors in {self.seconds:.1f}s ({rate:.0f}/s).")
+
+def approx_tokens(text: str) -> int:
+    """Token estimate of about four characters per token, for when no tiktoken encoding is available."""
+    return max(1, len(text) // 4)
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """`model`'s tiktoken encoding, or None if tiktoken is missing or cannot load (download) it."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken encoding for {model or 'cl100k_base'} unavailable ({type(e).__name__}); "
+              "estimating tokens at ~4 characters each.")
+        return None
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Token count of a text under `model`'s tiktoken encoding, else `approx_tokens`."""
+    def count(text: str) -> int:
+        encoding = _encoding(model)
+        if encoding is None:
+            return approx_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+    return count
+
+class DirectEmbeddings(Embeddings):
+    """Embeddings through the openai client, one request per batch of texts and no retries of its own."""
+    def __init__(self, model: str, chunk_size: int = MAX_REQUEST_INPUTS, **client_options):
+        from openai import OpenAI
+        client_options.setdefault("base_url", os.getenv("OPENAI_API_BASE") or None)
+        self.client = OpenAI(max_retries=0, **client_options)
+        self.model = model
+        self.chunk_size = chunk_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.chunk_size):
+            response = self.client.embeddings.create(model=self.model, input=texts[start:start + self.chunk_size])
+            vectors.extend(d.embedding for d in response.data)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def embedding_client(model: str, **client_options) -> Embeddings:
+    """Embeddings for `ingest`: one API request per packed batch, retries left to ingest."""
+    if _encoding(model) is None:
+        return DirectEmbeddings(model, **client_options)
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, chunk_size=MAX_REQUEST_INPUTS, max_retries=0, **client_options)
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int = MAX_REQUEST_TOKENS,
+                 max_inputs: int = MAX_REQUEST_INPUTS) -> List[List[int]]:
+    """Greedily pack texts, in order, into batches within `max_tokens` and `max_inputs`."""
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    tokens = 0
+    for i, n in enumerate(token_counts):
+        if batch and (tokens + n > max_tokens or len(batch) >= max_inputs):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(i)
+        tokens += n
+    if batch:
+        batches.append(batch)
+    return batches
+
+Writer = Callable[[List[str], List[List[float]], List[dict], List[str]], None]
+
+async def ingest(items: Sequence[IngestItem], embeddings, write: Writer,
+                 count_tokens: Callable[[str], int], limiter: Optional[AsyncRateLimiter] = None,
+                 concurrency: int = 4, retries: int = 3,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                 max_request_tokens: int = MAX_REQUEST_TOKENS, write_batch: int = WRITE_BATCH,
+                 progress: Optional[Callable[[IngestStats], None]] = None) -> IngestStats:
+    """
+    Embed `items` and pass them to `write(ids, vectors, metadatas, texts)` in
+    batches of up to `write_batch`. Returns counts and timings.
+    """
+    stats = IngestStats(texts=len(items))
+    started = time.perf_counter()
+    limiter = limiter or AsyncRateLimiter()
+    texts = [text for _, text, _ in items]
+    pending: List[Tuple[int, List[float]]] = []
+
+    def flush(force: bool = False) -> None:
+        while pending and (force or len(pending) >= write_batch):
+            block, pending[:] = pending[:write_batch], pending[write_batch:]
+            write([items[i][0] for i, _ in block], [v for _, v in block],
+                  [items[i][2] for i, _ in block], [items[i][1] for i, _ in block])
+            stats.written += len(block)
+            if progress is not None:
+                progress(stats)
+
+    # Vectors already in the embedding cache cost neither tokens nor requests.
+    todo = list(range(len(items)))
+    if hasattr(embeddings, "lookup"):
+        todo = []
+        for i, vector in enumerate(embeddings.lookup(texts)):
+            if vector is None:
+                todo.append(i)
+            else:
+                pending.append((i, vector))
+        stats.cached = len(items) - len(todo)
+        flush()
+
+    counts = [count_tokens(texts[i]) for i in todo]
+    packed = pack_batches(counts, max_request_tokens)
+    batches = [[todo[j] for j in batch] for batch in packed]
+    batch_tokens = [sum(counts[j] for j in batch) for batch in packed]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def embed(batch: List[int], n_tokens: int) -> Tuple[List[int], List[List[float]]]:
+        batch_texts = [texts[i] for i in batch]
+
+        async def call():
+            await limiter.acquire(n_tokens)
+            return await asyncio.to_thread(embeddings.embed_documents, batch_texts)
+        async with semaphore:
+            vectors = await retry_async(call, retries=retries, retry_on=retry_on)
+        stats.requests += 1
+        stats.tokens += n_tokens
+        return batch, vectors
+
+    tasks = [asyncio.ensure_future(embed(b, t)) for b, t in zip(batches, batch_tokens)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            batch, vectors = await done
+            pending.extend(zip(batch, vectors))
+            flush()
+    finally:
+        for task in tasks:
+            task.cancel()
+    flush(force=True)
+    stats.seconds = time.perf_counter() - started
+    return stats
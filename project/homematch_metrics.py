@@ -0,0 +1,191 @@
+"""Per-stage latency and API/token accounting for the HomeMatch online app, written as a trace and Prometheus text."""
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_TRACE_PATH = "./homematch_trace.json"
+DEFAULT_METRICS_PATH = "./homematch_metrics.prom"
+METRIC_PREFIX = "homematch"
+TRACE_SCHEMA = 1
+# Chat formatting overhead per message and per reply (OpenAI's token counting guide).
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+COUNTER_HELP = {
+    "embedding_calls": "Embedding API requests.",
+    "embedding_inputs": "Texts sent to the embedding API.",
+    "embedding_tokens": "Tokens sent to the embedding API (tiktoken count).",
+    "embedding_cache_hits": "Embeddings answered by the embedding cache.",
+    "embedding_cache_misses": "Embeddings computed by the API.",
+    "llm_calls": "Chat completion calls.",
+    "llm_errors": "Chat completion calls that raised.",
+    "llm_prompt_tokens": "Prompt tokens of chat completion calls.",
+    "llm_completion_tokens": "Completion tokens of chat completion calls.",
+    "llm_usage_estimated": "Chat completion calls whose tokens were counted locally (no usage from the API).",
+    "response_cache_hits": "Personalized descriptions answered by the response cache.",
+    "response_cache_misses": "Personalized descriptions that had to be generated.",
+    "listings_loaded": "Listings loaded after near-duplicate removal.",
+    "listings_retrieved": "Listings returned by retrieval.",
+}
+
+class PipelineMetrics:
+    """Thread-safe spans and counters for one run of the app."""
+    def __init__(self):
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[dict] = []
+        self.counters: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """Seconds since the run started."""
+        return time.perf_counter() - self._t0
+
+    def record(self, name: str, start: float, seconds: float, **attrs) -> None:
+        span = {"name": name, "start": round(start, 6), "seconds": round(seconds, 6)}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        """Time the enclosed block as a span named `name`."""
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, start, self.now() - start, **attrs)
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span["name"], {"count": 0, "seconds": 0.0})
+                total["count"] += 1
+                total["seconds"] += span["seconds"]
+        return totals
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+            counters = dict(self.counters)
+        return {
+            "schema": TRACE_SCHEMA,
+            "started_at": self.started_at,
+            "total_seconds": round(self.now(), 6),
+            "spans": spans,
+            "counters": counters,
+        }
+
+    def write_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def prometheus_text(self) -> str:
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds_total Cumulative wall time per stage (concurrent spans add up).",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        totals = self.stage_totals()
+        for name, total in sorted(totals.items()):
+            lines.append(f'{p}_stage_seconds_total{{stage="{name}"}} {total["seconds"]:.6f}')
+        lines += [f"# HELP {p}_stage_runs_total Spans recorded per stage.", f"# TYPE {p}_stage_runs_total counter"]
+        for name, total in sorted(totals.items()):
+            lines.append(f'{p}_stage_runs_total{{stage="{name}"}} {total["count"]}')
+        with self._lock:
+            counters = dict(self.counters)
+        for name in sorted(counters):
+            lines.append(f"# HELP {p}_{name}_total {COUNTER_HELP.get(name, name.replace('_', ' ').capitalize() + '.')}")
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {counters[name]:g}")
+        lines += [f"# HELP {p}_run_seconds Wall time of the run.", f"# TYPE {p}_run_seconds gauge",
+                  f"{p}_run_seconds {self.now():.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+
+    def summary(self, stages: Optional[List[str]] = None) -> str:
+        totals = self.stage_totals()
+        names = stages if stages is not None else list(totals)
+        parts = [f"{name} {totals[name]['seconds']:.2f}s" for name in names if name in totals]
+        return "Stage timings: " + " | ".join(parts)
+
+class InstrumentedEmbeddings(Embeddings):
+    """Embeddings wrapper that records one span and call/input/token counts per API request."""
+    def __init__(self, embeddings: Embeddings, metrics: PipelineMetrics, count_tokens: Callable[[str], int]):
+        self.embeddings = embeddings
+        self.metrics = metrics
+        self.count_tokens = count_tokens
+
+    def _account(self, texts: List[str]) -> None:
+        self.metrics.add("embedding_calls")
+        self.metrics.add("embedding_inputs", len(texts))
+        self.metrics.add("embedding_tokens", sum(self.count_tokens(t) for t in texts))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.metrics.stage("embedding_request", inputs=len(texts)):
+            vectors = self.embeddings.embed_documents(texts)
+        self._account(texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.metrics.stage("embedding_request", inputs=1):
+            vector = self.embeddings.embed_query(text)
+        self._account([text])
+        return vector
+
+def _reported_usage(response) -> Optional[Dict[str, int]]:
+    # Non-streamed calls report usage in llm_output; messages may carry usage_metadata.
+    usage = (response.llm_output or {}).get("token_usage") if response.llm_output else None
+    if usage and usage.get("prompt_tokens") is not None:
+        return {"prompt": usage["prompt_tokens"], "completion": usage.get("completion_tokens", 0)}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return {"prompt": metadata["input_tokens"], "completion": metadata["output_tokens"]}
+    return None
+
+class UsageCallback(BaseCallbackHandler):
+    """LangChain callback that records a span and token usage for every chat model call."""
+    run_inline = True  # record timings when events happen, not when an executor gets to them
+
+    def __init__(self, metrics: PipelineMetrics, count_tokens: Callable[[str], int]):
+        self.metrics = metrics
+        self.count_tokens = count_tokens
+        self._runs: Dict[object, tuple] = {}  # run_id -> (start, estimated prompt tokens)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt = sum(TOKENS_PER_MESSAGE + self.count_tokens(str(m.content)) for batch in messages for m in batch)
+        self._runs[run_id] = (self.metrics.now(), prompt + TOKENS_PER_REPLY)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, prompt = self._runs.pop(run_id, (self.metrics.now(), 0))
+        usage = _reported_usage(response)
+        if usage is None:
+            self.metrics.add("llm_usage_estimated")
+            completion = sum(self.count_tokens(g.text) for gens in response.generations for g in gens)
+            usage = {"prompt": prompt, "completion": completion}
+        self.metrics.add("llm_calls")
+        self.metrics.add("llm_prompt_tokens", usage["prompt"])
+        self.metrics.add("llm_completion_tokens", usage["completion"])
+        self.metrics.record("llm_call", start, self.metrics.now() - start,
+                            prompt_tokens=usage["prompt"], completion_tokens=usage["completion"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start, _ = self._runs.pop(run_id, (self.metrics.now(), 0))
+        self.metrics.add("llm_errors")
+        self.metrics.record("llm_call", start, self.metrics.now() - start, error=type(error).__name__)
@@ -1,39 +1,44 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import json
 import os
+import sys
 import argparse
-from dataclasses import dataclass
-from typing import List, Tuple
+import contextlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator, List, Optional, TextIO, Tuple
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from feature_matcher import FEATURE_AUTOMATON
 
-@dataclass
-class ListingDoc:
-    page_content: str
-    metadata: dict
+# numpy/scipy and the index modules are imported where they are used, so --help
+# and argument errors return without loading them.
+if TYPE_CHECKING:
+    import numpy as np
+    from homematch_incremental import IncrementalIndex
+    from homematch_index import IndexSnapshot
+    from listing_store import ListingStore
 
-def load_listings(path: str) -> List[ListingDoc]:
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    docs: List[ListingDoc] = []
-    for i, listing in enumerate(data["listings"]):
-        content = (
-            f"Property Description: {listing['description']}\n"
-            f"Neighborhood: {listing['neighborhood_description']}"
-        )
-        metadata = {
-            "id": f"listing_{i}",
-            "neighborhood": listing['neighborhood'],
-            "price": listing['price'],
-            "bedrooms": listing['bedrooms'],
-            "bathrooms": listing['bathrooms'],
-            "house_size_sqft": listing['house_size_sqft'],
-            "full_description": listing['description'],
-            "neighborhood_description": listing['neighborhood_description']
-        }
-        docs.append(ListingDoc(page_content=content, metadata=metadata))
-    return docs
+def load_listings(path: str, dedup: Optional[dict] = None, index_dir: Optional[str] = None) -> ListingStore:
+    """With `index_dir`, near-duplicate removal is cached beside the snapshot there."""
+    from homematch_index import load_listing_store
+    from listing_store import ListingStore
+    store = ListingStore.load(path, dedup) if index_dir is None else load_listing_store(path, dedup, index_dir)
+    if store.n_dropped:
+        print(f"Dropped {store.n_dropped} near-duplicate listing(s) from {path}.")
+    return store
+
+def dedup_settings(args) -> Optional[dict]:
+    """Near-duplicate settings for loading listings (None = keep every listing)."""
+    from near_duplicates import DEDUP_SETTINGS
+    if args.no_dedupe:
+        return None
+    if args.dedupe_threshold is None:
+        return dict(DEDUP_SETTINGS)
+    if not 0.0 < args.dedupe_threshold <= 1.0:
+        raise ValueError("--dedupe-threshold must be in (0, 1].")
+    return dict(DEDUP_SETTINGS, threshold=args.dedupe_threshold)
 
 def default_buyer_profile() -> str:
     answers = [
@@ -43,97 +48,346 @@ def default_buyer_profile() -> str:
         "Easy access to a reliable bus line, proximity to a major highway, and bike-friendly roads.",
         "A balance between suburban tranquility and access to urban amenities like restaurants and theaters."
     ]
-    profile = "Buyer Profile:\n" + "\n".join(f"- {a}" for a in answers)
-    return profile
-
-def build_vector_index(docs: List[ListingDoc]):
-    corpus = [d.page_content for d in docs]
-    vectorizer = TfidfVectorizer(ngram_range=(1,2), stop_words='english', min_df=1)
-    X = vectorizer.fit_transform(corpus)
-    return vectorizer, X
-
-def retrieve_top_k(vectorizer, X, query: str, k: int) -> List[int]:
-    q = vectorizer.transform([query])
-    sims = cosine_similarity(q, X)[0]
-    order = sims.argsort()[::-1]
-    return order[:k].tolist()
-
-FEATURE_KEYWORDS = {
-    "schools": ["school", "schools"],
-    "shopping": ["shopping", "market", "plaza", "grocery"],
-    "backyard": ["backyard", "garden", "yard", "patio"],
-    "garage": ["garage"],
-    "energy": ["energy", "insulation", "solar", "hvac"],
-    "transit": ["bus", "transit", "subway", "ferry"],
-    "highway": ["highway", "express"],
-    "bike": ["bike", "bikeshare", "cycle"],
-    "restaurants": ["restaurant", "dining", "eateries"],
-    "theaters": ["theater", "theatre", "arts", "galleries"],
-    "parks": ["park", "trails", "greenbelt"],
-}
+    return format_buyer_profile(answers)
 
-def match_features(text: str) -> List[str]:
-    hits = []
-    lower = text.lower()
-    for name, kws in FEATURE_KEYWORDS.items():
-        if any(k in lower for k in kws):
-            hits.append(name)
-    return hits
-
-def heuristic_personalization(buyer_profile: str, md: dict) -> str:
-    listing_text = (md.get("full_description", "") + "\n" + md.get("neighborhood_description", "")).strip()
-    matches = match_features(listing_text)
-    bp_lines = [ln.strip(" -") for ln in buyer_profile.splitlines() if ln.strip().startswith("-")]
-
-    para1 = (
-        f"Based on what you're looking for, this {md['bedrooms']} bed, "
-        f"{md['bathrooms']} bath, {md['house_size_sqft']} sqft home in {md['neighborhood']} "
-        f"could be a strong match. Priced at ${md['price']:,}, it offers the essentials you highlighted, "
-        f"without compromising on day-to-day comfort."
-    )
-
-    para2 = (
-        "Inside, the existing features focus on livability—" 
-        "a practical layout and a kitchen/living area that supports everyday routines. "
-        "From your preferences, we paid close attention to details like a comfortable space for gathering, "
-        "room to cook, and an overall calm atmosphere."
-    )
-
-    if matches:
-        bullet_intro = "This listing also aligns with your interests in:"
-        bullets = "\n".join(f"- {m}" for m in matches)
-        para3 = f"{bullet_intro}\n{bullets}"
+def format_buyer_profile(answers: List[str]) -> str:
+    return "Buyer Profile:\n" + "\n".join(f"- {a}" for a in answers)
+
+def build_vector_index(docs: ListingStore):
+    from homematch_index import fit_tfidf
+    corpus = list(docs.page_contents())
+    return fit_tfidf(corpus)
+
+def retrieve_top_k(vectorizer, X, query: str, k: int, shard_rows: int = 0,
+                   candidates: Optional[np.ndarray] = None) -> List[int]:
+    # Rows of X and the query vector are L2-normalized, so a dot product is cosine similarity.
+    # `candidates` (sorted row ids from a pre-filter) restricts scoring to those rows.
+    from homematch_retrieval import iter_row_shards, query_vector, streaming_top_k, top_k_for_rows, top_k_from_scores
+    q = query_vector(vectorizer, query)
+    if shard_rows > 0:
+        top = streaming_top_k(q, iter_row_shards(X, shard_rows), k, candidates)
+    elif candidates is not None:
+        top = top_k_for_rows(X, q, candidates, k)
     else:
-        para3 = (
-            "The neighborhood context emphasizes convenience and relaxation, with amenities and connections "
-            "that make daily life easier."
-        )
+        top = top_k_from_scores(X.dot(q), k)
+    return [doc for doc, _ in top]
+
+def numeric_filters(args) -> dict:
+    return {
+        "price": (args.min_price, args.max_price),
+        "bedrooms": (args.min_bedrooms, args.max_bedrooms),
+        "bathrooms": (args.min_bathrooms, args.max_bathrooms),
+        "house_size_sqft": (args.min_sqft, args.max_sqft),
+    }
+
+def iter_profile_chunks(path: str, chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    """Stream (profile_id, profile_text) pairs from a JSONL file in chunks."""
+    chunk: List[Tuple[str, str]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "profile" in record:
+                text = record["profile"]
+            elif "answers" in record:
+                text = format_buyer_profile(record["answers"])
+            else:
+                raise SystemExit(f"{path}:{line_no}: expected a 'profile' or 'answers' field")
+            chunk.append((str(record.get("id", line_no)), text))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def score_profile_batch(vectorizer, X, texts: List[str], k: int,
+                        candidates: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+    """Score a chunk of profiles with one sparse product (rows are L2-normalized, so this is cosine)."""
+    from homematch_retrieval import top_k_from_row
+    Q = vectorizer.transform(texts)
+    Xc = X if candidates is None else X[candidates]
+    S = (Q @ Xc.T).tocsr()
+    results = []
+    for r in range(S.shape[0]):
+        start, end = S.indptr[r], S.indptr[r + 1]
+        top = top_k_from_row(S.indices[start:end], S.data[start:end], Xc.shape[0], k)
+        if candidates is not None:
+            top = [(int(candidates[doc]), score) for doc, score in top]
+        results.append(top)
+    return results
+
+def run_batch(vectorizer, X, docs: ListingStore, profiles_path: str, output_path: str,
+              k: int, chunk_size: int, candidates: Optional[np.ndarray] = None) -> int:
+    """Match every profile in `profiles_path` and write one JSONL result line per profile."""
+    written = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for chunk in iter_profile_chunks(profiles_path, chunk_size):
+            ids = [pid for pid, _ in chunk]
+            results = score_profile_batch(vectorizer, X, [text for _, text in chunk], k, candidates)
+            for pid, top in zip(ids, results):
+                matches = [{"listing_id": docs[doc].metadata["id"], "score": round(score, 6)} for doc, score in top]
+                out.write(json.dumps({"id": pid, "matches": matches}) + "\n")
+            written += len(chunk)
+    return written
 
-    para4 = (
-        f"Neighborhood notes: {md['neighborhood_description']}"
-    )
+def pending_listing_changes(args) -> List[dict]:
+    """Delta-log operations requested with --add-listings / --remove-ids."""
+    from listing_store import parse_listing_id
+    ops: List[dict] = []
+    if args.add_listings:
+        with open(args.add_listings, 'r', encoding='utf-8') as f:
+            ops += [{"op": "add", "listing": listing} for listing in json.load(f)["listings"]]
+    if args.remove_ids:
+        for listing_id in (i.strip() for i in args.remove_ids.split(",")):
+            if listing_id:
+                try:
+                    parse_listing_id(listing_id)
+                except ValueError as e:
+                    raise SystemExit(str(e))
+                ops.append({"op": "remove", "id": listing_id})
+    return ops
 
-    return "\n\n".join([para1, para2, para3, para4])
+def open_incremental_index(args, listings_path: str, snapshot: IndexSnapshot, docs: ListingStore,
+                           logged_ops: List[dict], background: bool = False) -> Optional[IncrementalIndex]:
+    """
+    Replay the delta log and apply this run's listing changes; None when there are none.
+    Compacts on excess idf drift, in a background thread with `background`.
+    """
+    from homematch_incremental import DEFAULT_DRIFT_TOLERANCE, IncrementalIndex, append_delta_log, delta_log_path
+    new_ops = pending_listing_changes(args)
+    if not logged_ops and not new_ops:
+        return None
+    tolerance = DEFAULT_DRIFT_TOLERANCE if args.drift_tolerance is None else args.drift_tolerance
+    index = IncrementalIndex(snapshot, docs, drift_tolerance=tolerance)
+    index.replay(logged_ops, applied=snapshot.delta_applied)
+    if new_ops:
+        index.replay(new_ops)
+        append_delta_log(delta_log_path(listings_path, args.index_dir), snapshot.fingerprint, new_ops)
+        logged_ops.extend(new_ops)
+        print(f"Applied {len(new_ops)} listing change(s); {len(logged_ops)} recorded in the delta log.")
+    drift = index.drift()
+    if drift > index.drift_tolerance:
+        print(f"Index idf drift {drift:.3f} exceeds tolerance {index.drift_tolerance}; compacting.")
+        index.compact(background=background)
+    return index
 
+def finish_incremental_index(index: Optional[IncrementalIndex], snapshot: IndexSnapshot, n_ops: int) -> None:
+    """Wait for any running compaction and persist a compacted index, folding the delta log into the snapshot."""
+    if index is not None and index.wait_for_compaction():
+        index.save(snapshot.path, snapshot.fingerprint, delta_applied=n_ops, source=snapshot.source,
+                   dedup=snapshot.dedup)
+        print(f"Compacted TF-IDF index snapshot saved to {snapshot.path}.")
+
+@dataclass
+class OfflineIndex:
+    docs: ListingStore
+    vectorizer: object  # SnapshotVectorizer/TfidfVectorizer, or the IncrementalIndex standing in for it
+    X: object
+    features: np.ndarray
+    snapshot: Optional[IndexSnapshot] = None
+    incremental: Optional[IncrementalIndex] = None
+    logged_ops: List[dict] = field(default_factory=list)
+
+def open_offline_index(args, listings_path: str, background: bool = False) -> OfflineIndex:
+    """
+    Load (or fit) the TF-IDF index for the listings file, replaying incremental changes.
+    With `background` a compaction may still be running; query through `incremental.search`.
+    """
+    from feature_matcher import feature_masks
+    from homematch_incremental import delta_log_path, read_delta_log
+    from homematch_index import load_or_build_index
+    dedup = dedup_settings(args)
+    if args.no_index_cache:
+        if args.add_listings or args.remove_ids:
+            raise ValueError("--add-listings/--remove-ids need the persisted index; drop --no-index-cache.")
+        docs = load_listings(listings_path, dedup)
+        vectorizer, X = build_vector_index(docs)
+        return OfflineIndex(docs, vectorizer, X, feature_masks(docs.feature_texts()))
+
+    snapshot = load_or_build_index(listings_path, lambda: load_listings(listings_path, dedup, args.index_dir),
+                                   index_dir=args.index_dir, rebuild=args.rebuild_index, dedup=dedup)
+    logged_ops = read_delta_log(delta_log_path(listings_path, args.index_dir), snapshot.fingerprint)
+    if snapshot.delta_applied > len(logged_ops):
+        # The snapshot folds in changes whose log is gone; start again from the listings file.
+        snapshot = load_or_build_index(listings_path, lambda: load_listings(listings_path, dedup, args.index_dir),
+                                       index_dir=args.index_dir, rebuild=True, dedup=dedup)
+    docs = snapshot.store
+    index = open_incremental_index(args, listings_path, snapshot, docs, logged_ops, background)
+    if index is None:
+        return OfflineIndex(docs, snapshot.vectorizer, snapshot.matrix, snapshot.features, snapshot)
+    return OfflineIndex(docs, index, index.as_matrix(), index.features, snapshot, index, logged_ops)
+
+def select_candidates(oi: OfflineIndex, ranges: dict, required: List[str]) -> Optional[np.ndarray]:
+    """Rows passing the numeric and feature filters (None = every live listing)."""
+    candidates = oi.docs.numeric_index.filter_rows(ranges)
+    if oi.incremental is not None:
+        candidates = oi.incremental.restrict(candidates)
+    return feature_candidates(oi.features, required, candidates)
+
+def match_features(text: str) -> List[str]:
+    return FEATURE_AUTOMATON.decode(FEATURE_AUTOMATON.scan(text))
+
+def feature_candidates(features: np.ndarray, required: List[str], candidates: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Narrow candidate rows to listings whose feature bitmask has every required feature."""
+    if not required:
+        return candidates
+    import numpy as np
+    need = FEATURE_AUTOMATON.mask_for(required)
+    if candidates is None:
+        return np.flatnonzero((features & need) == need)
+    return candidates[(features[candidates] & need) == need]
+
+PARA1_TEMPLATE = (
+    "Based on what you're looking for, this {bedrooms} bed, "
+    "{bathrooms} bath, {house_size_sqft} sqft home in {neighborhood} "
+    "could be a strong match. Priced at ${price:,}, it offers the essentials you highlighted, "
+    "without compromising on day-to-day comfort."
+)
+
+PARA2 = (
+    "Inside, the existing features focus on livability—"
+    "a practical layout and a kitchen/living area that supports everyday routines. "
+    "From your preferences, we paid close attention to details like a comfortable space for gathering, "
+    "room to cook, and an overall calm atmosphere."
+)
+
+PARA3_NO_MATCH = (
+    "The neighborhood context emphasizes convenience and relaxation, with amenities and connections "
+    "that make daily life easier."
+)
+
+PARA4_TEMPLATE = "Neighborhood notes: {neighborhood_description}"
+
+@lru_cache(maxsize=None)
+def features_paragraph(feature_mask: int) -> str:
+    matches = FEATURE_AUTOMATON.decode(feature_mask)
+    if not matches:
+        return PARA3_NO_MATCH
+    bullets = "\n".join(f"- {m}" for m in matches)
+    return f"This listing also aligns with your interests in:\n{bullets}"
+
+def heuristic_personalization(buyer_profile: str, md: dict, feature_mask: Optional[int] = None) -> str:
+    if feature_mask is None:
+        listing_text = (md.get("full_description", "") + "\n" + md.get("neighborhood_description", "")).strip()
+        feature_mask = FEATURE_AUTOMATON.scan(listing_text)
+
+    return "\n\n".join([
+        PARA1_TEMPLATE.format_map(md),
+        PARA2,
+        features_paragraph(feature_mask),
+        PARA4_TEMPLATE.format_map(md),
+    ])
+
+def render_batch_output(args, listings_path: str, oi: OfflineIndex, stream: Optional[TextIO] = None) -> None:
+    """Render personalized descriptions for the batch results just written to --batch-output."""
+    from homematch_render import render_batch
+    if args.render_chunk_size < 1:
+        raise SystemExit("--render-chunk-size must be at least 1")
+    snapshot_dir = oi.snapshot.path if oi.snapshot is not None else None
+    # The snapshot store already holds the adds folded in by the last compaction.
+    applied = oi.snapshot.delta_applied if snapshot_dir is not None else 0
+    added = [op["listing"] for op in oi.logged_ops[applied:] if op["op"] == "add"]
+    render = lambda out: render_batch(listings_path, added, args.batch_profiles, args.batch_output,
+                                      out, args.render_workers, args.render_chunk_size, dedup_settings(args),
+                                      snapshot_dir)
+    if stream is not None:
+        n = render(stream)
+        stream.flush()
+        print(f"Rendered {n} buyer profiles to stdout.")
+        return
+    with open(args.render_output, 'w', encoding='utf-8') as out:
+        n = render(out)
+    print(f"Rendered {n} buyer profiles; personalized descriptions written to {args.render_output}.")
+
+def resolve_listings_path(args) -> str:
+    if args.listings:
+        return args.listings
+    if os.path.exists("listings.json"):
+        return "listings.json"
+    if os.path.exists("offline_listings.json"):
+        return "offline_listings.json"
+    raise SystemExit("No listings file found. Provide --listings or ensure listings.json/offline_listings.json exists.")
 
 def main():
     ap = argparse.ArgumentParser(description="Offline HomeMatch: TF-IDF retrieval and heuristic personalization")
     ap.add_argument("--listings", default=None, help="Path to listings JSON. Defaults to listings.json or offline_listings.json")
     ap.add_argument("--k", type=int, default=3, help="Top-k listings to display")
     ap.add_argument("--interactive", action="store_true", help="Enter buyer preferences interactively")
+    ap.add_argument("--index-dir", default=None, help="Directory for persisted TF-IDF index snapshots (default .homematch_index)")
+    ap.add_argument("--rebuild-index", action="store_true", help="Refit the TF-IDF index even if a matching snapshot exists")
+    ap.add_argument("--no-index-cache", action="store_true", help="Fit the TF-IDF index in memory without reading or writing a snapshot")
+    ap.add_argument("--shard-rows", type=int, default=0, help="Score the index in row shards of this size (0 = whole matrix at once)")
+    ap.add_argument("--min-price", type=float, default=None, help="Only consider listings priced at or above this")
+    ap.add_argument("--max-price", type=float, default=None, help="Only consider listings priced at or below this")
+    ap.add_argument("--min-bedrooms", type=float, default=None, help="Minimum number of bedrooms")
+    ap.add_argument("--max-bedrooms", type=float, default=None, help="Maximum number of bedrooms")
+    ap.add_argument("--min-bathrooms", type=float, default=None, help="Minimum number of bathrooms")
+    ap.add_argument("--max-bathrooms", type=float, default=None, help="Maximum number of bathrooms")
+    ap.add_argument("--min-sqft", type=float, default=None, help="Minimum house size in sqft")
+    ap.add_argument("--max-sqft", type=float, default=None, help="Maximum house size in sqft")
+    ap.add_argument("--require-features", default=None, help="Comma-separated features every match must have, e.g. garage,transit")
+    ap.add_argument("--no-dedupe", action="store_true", help="Keep near-duplicate listings instead of one per cluster")
+    ap.add_argument("--dedupe-threshold", type=float, default=None,
+                    help="Estimated Jaccard similarity of word shingles at which listings count as near-duplicates (default 0.8)")
+    ap.add_argument("--add-listings", default=None, help="Listings JSON to append to the index without refitting")
+    ap.add_argument("--remove-ids", default=None, help="Comma-separated listing ids to tombstone, e.g. listing_3,listing_7")
+    ap.add_argument("--drift-tolerance", type=float, default=None,
+                    help="Max relative idf drift before the incremental index is compacted (default 0.05)")
+    ap.add_argument("--serve", action="store_true", help="Run a long-lived HTTP/JSON query server instead of a single query")
+    ap.add_argument("--host", default="127.0.0.1", help="Server bind address")
+    ap.add_argument("--port", type=int, default=8080, help="Server port")
+    ap.add_argument("--watch-interval", type=float, default=2.0, help="Seconds between listings-file change checks in server mode")
+    ap.add_argument("--batch-profiles", default=None, help="JSONL file of buyer profiles to match in batch mode")
+    ap.add_argument("--batch-output", default="batch_matches.jsonl", help="JSONL file for batch-mode results")
+    ap.add_argument("--chunk-size", type=int, default=512, help="Profiles scored per sparse matrix product in batch mode")
+    ap.add_argument("--render-output", default=None, help="After batch matching, write personalized descriptions as JSONL to this file ('-' for stdout)")
+    ap.add_argument("--render-workers", type=int, default=os.cpu_count() or 4, help="Worker processes for --render-output (1 = render inline)")
+    ap.add_argument("--render-chunk-size", type=int, default=64, help="Profiles handed to a render worker at a time")
     args = ap.parse_args()
 
-    # Resolve listings path
-    if args.listings:
-        listings_path = args.listings
-    elif os.path.exists("listings.json"):
-        listings_path = "listings.json"
-    elif os.path.exists("offline_listings.json"):
-        listings_path = "offline_listings.json"
+    if args.render_output and not args.batch_profiles:
+        raise SystemExit("--render-output renders batch results; pass --batch-profiles as well.")
+    if args.render_output == "-":
+        # Keep stdout for the rendered JSONL; status messages go to stderr.
+        render_stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            run(args, render_stream)
     else:
-        raise SystemExit("No listings file found. Provide --listings or ensure listings.json/offline_listings.json exists.")
+        run(args)
 
-    docs = load_listings(listings_path)
+def run(args, render_stream: Optional[TextIO] = None):
+    listings_path = resolve_listings_path(args)
+    if args.index_dir is None:
+        from homematch_index import DEFAULT_INDEX_DIR
+        args.index_dir = DEFAULT_INDEX_DIR
+
+    if args.serve:
+        if args.add_listings or args.remove_ids:
+            raise SystemExit("--add-listings/--remove-ids cannot be combined with --serve.")
+        from homematch_server import serve
+        serve(args, listings_path)
+        return
+
+    try:
+        oi = open_offline_index(args, listings_path)
+        required = [f.strip() for f in args.require_features.split(",") if f.strip()] if args.require_features else []
+        candidates = select_candidates(oi, numeric_filters(args), required)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    docs, vectorizer, X, features = oi.docs, oi.vectorizer, oi.X, oi.features
+    if candidates is not None:
+        print(f"{len(candidates)} of {len(docs)} listings match the filters.")
+
+    if args.batch_profiles:
+        if args.chunk_size < 1:
+            raise SystemExit("--chunk-size must be at least 1")
+        n = run_batch(vectorizer, X, docs, args.batch_profiles, args.batch_output, args.k, args.chunk_size, candidates)
+        print(f"Matched {n} buyer profiles; results written to {args.batch_output}.")
+        if args.render_output:
+            render_batch_output(args, listings_path, oi, render_stream)
+        finish_incremental_index(oi.incremental, oi.snapshot, len(oi.logged_ops))
+        return
 
     if args.interactive:
         print("Enter a short paragraph about your preferences (end with Ctrl-D / Ctrl-Z):")
@@ -147,13 +401,12 @@ def main():
     print("\n--- Buyer Preferences ---")
     print(buyer_profile)
 
-    vectorizer, X = build_vector_index(docs)
-    top_idx = retrieve_top_k(vectorizer, X, buyer_profile, args.k)
+    top_idx = retrieve_top_k(vectorizer, X, buyer_profile, args.k, shard_rows=args.shard_rows, candidates=candidates)
 
     print("\n--- Matches ---")
     for rank, idx in enumerate(top_idx, start=1):
         md = docs[idx].metadata
-        desc = heuristic_personalization(buyer_profile, md)
+        desc = heuristic_personalization(buyer_profile, md, feature_mask=int(features[idx]))
         print(f"\n======= MATCH {rank}: {md['neighborhood']} =======")
         print(f"Price: ${md['price']:,} | {md['bedrooms']} Bed | {md['bathrooms']} Bath | {md['house_size_sqft']} sqft")
         print("---")
@@ -162,5 +415,7 @@ def main():
         print(md['full_description'])
         print("==================================================")
 
+    finish_incremental_index(oi.incremental, oi.snapshot, len(oi.logged_ops))
+
 if __name__ == "__main__":
     main()
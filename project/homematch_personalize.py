@@ -0,0 +1,146 @@
+"""Concurrent, rate-limited LLM personalization of ranked matches, yielded (or streamed) in rank order."""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from rate_limit import retry_async
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+# Token estimate per call for the tokens-per-minute limit: template and reply budget
+# plus roughly four characters per token of listing and profile text.
+PROMPT_OVERHEAD_TOKENS = 250
+COMPLETION_TOKENS = 600
+
+def personalization_input(buyer_profile, md):
+    return {
+        "buyer_preferences": buyer_profile,
+        "neighborhood": md['neighborhood'],
+        "price": md['price'],
+        "bedrooms": md['bedrooms'],
+        "bathrooms": md['bathrooms'],
+        "house_size_sqft": md['house_size_sqft'],
+        "original_description": md['full_description'],
+        "neighborhood_description": md['neighborhood_description']
+    }
+
+def estimate_tokens(chain_input):
+    return PROMPT_OVERHEAD_TOKENS + COMPLETION_TOKENS + sum(len(str(v)) for v in chain_input.values()) // 4
+
+async def personalize_in_rank_order(chain, buyer_profile, docs, limiter, concurrency=4, retries=3,
+                                    cache=None, cache_key=None):
+    """Yield (rank, doc, description) in rank order while up to `concurrency` calls run; `cache` skips repeats."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate(doc):
+        key = cache_key(doc) if cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        chain_input = personalization_input(buyer_profile, doc.metadata)
+
+        async def call():
+            await limiter.acquire(estimate_tokens(chain_input))
+            return await chain.ainvoke(chain_input)
+        async with semaphore:
+            description = await retry_async(call, retries=retries, retry_on=RETRYABLE_ERRORS)
+        if key is not None:
+            cache.put(key, description)
+        return description
+
+    tasks = [asyncio.ensure_future(generate(doc)) for doc in docs]
+    try:
+        for i, (doc, task) in enumerate(zip(docs, tasks)):
+            yield i, doc, await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@dataclass
+class GenerationTiming:
+    """Per-listing streaming latencies, in seconds."""
+    rank: int
+    listing_id: str
+    queued: float = 0.0       # stage start -> request sent (concurrency slot and rate limiter)
+    first_token: float = 0.0  # request sent -> first token (time to first token)
+    total: float = 0.0        # request sent -> last token
+    shown: float = 0.0        # stage start -> first token of this match on screen (perceived latency)
+    chunks: int = 0
+    chars: int = 0
+    cached: bool = False      # answered from the response cache
+
+async def stream_in_rank_order(chain, buyer_profile, docs, limiter, timings, concurrency=4, retries=3,
+                               cache=None, cache_key=None):
+    """Streaming `personalize_in_rank_order`: yield (rank, doc, chunk) in rank order, a None chunk ending each match."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    stage_start = time.perf_counter()
+    queues = [asyncio.Queue() for _ in docs]
+    timings.extend(GenerationTiming(i, doc.metadata["id"]) for i, doc in enumerate(docs))
+
+    async def generate(i, doc):
+        chain_input = personalization_input(buyer_profile, doc.metadata)
+        timing, queue = timings[i], queues[i]
+        key = cache_key(doc) if cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                timing.queued = time.perf_counter() - stage_start
+                timing.cached = True
+                timing.chunks, timing.chars = 1, len(cached)
+                queue.put_nowait(cached)
+                queue.put_nowait(None)
+                return
+        parts = []
+
+        async def call():
+            await limiter.acquire(estimate_tokens(chain_input))
+            sent = time.perf_counter()
+            timing.queued = sent - stage_start
+            try:
+                async for chunk in chain.astream(chain_input):
+                    if not chunk:
+                        continue
+                    if not timing.chunks:
+                        timing.first_token = time.perf_counter() - sent
+                    timing.chunks += 1
+                    timing.chars += len(chunk)
+                    parts.append(chunk)
+                    queue.put_nowait(chunk)
+            except RETRYABLE_ERRORS as e:
+                # Only a call that has not shown any chunks yet can be retried.
+                if timing.chunks:
+                    raise RuntimeError(f"Stream for {timing.listing_id} failed after {timing.chunks} chunks") from e
+                raise
+            timing.total = time.perf_counter() - sent
+        try:
+            async with semaphore:
+                await retry_async(call, retries=retries, retry_on=RETRYABLE_ERRORS)
+            if key is not None:
+                cache.put(key, "".join(parts))
+        finally:
+            queue.put_nowait(None)
+
+    tasks = [asyncio.ensure_future(generate(i, doc)) for i, doc in enumerate(docs)]
+    try:
+        for i, doc in enumerate(docs):
+            while True:
+                chunk = await queues[i].get()
+                if chunk is None:
+                    break
+                if not timings[i].shown:
+                    timings[i].shown = time.perf_counter() - stage_start
+                yield i, doc, chunk
+            await tasks[i]  # re-raises a failed generation
+            yield i, doc, None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def print_generation_timings(timings):
+    print("\n--- Generation Timings (seconds) ---")
+    print(f"{'match':>5}  {'listing':<14}{'queued':>8}{'TTFT':>8}{'total':>8}{'shown':>8}{'chars':>7}")
+    for t in timings:
+        print(f"{t.rank + 1:>5}  {t.listing_id:<14}{t.queued:>8.2f}{t.first_token:>8.2f}{t.total:>8.2f}"
+              f"{t.shown:>8.2f}{t.chars:>7}{'  (cached)' if t.cached else ''}")
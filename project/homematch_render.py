@@ -0,0 +1,109 @@
+"""Bulk rendering of personalized descriptions for offline batch runs over a process pool."""
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from feature_matcher import FEATURE_AUTOMATON
+from homematch_offline import heuristic_personalization, iter_profile_chunks
+from listing_store import ListingStore
+
+# (profile_id, profile_text, [(listing_id, score), ...])
+RenderItem = Tuple[str, str, List[Tuple[str, float]]]
+
+_store: Optional[ListingStore] = None
+_features: Optional[np.ndarray] = None  # stored feature masks of the snapshot rows
+_feature_cache: dict = {}
+
+def _init_worker(listings_path: str, added: List[dict], dedup: Optional[dict] = None,
+                 snapshot_dir: Optional[str] = None) -> None:
+    """
+    Open the listing store once per worker, memory-mapped from `snapshot_dir` when given.
+    `added` are the delta-log appends not yet in that store, in log order.
+    """
+    global _store, _features
+    if snapshot_dir is not None:
+        _store = ListingStore.open(os.path.join(snapshot_dir, "store"), mmap_mode=True)
+        _features = np.load(os.path.join(snapshot_dir, "features.npy"), mmap_mode="r")
+    else:
+        _store = ListingStore.load(listings_path, dedup)
+        _features = None
+    if added:
+        _store.extend(added)
+    _feature_cache.clear()
+
+def _feature_mask(row: int) -> int:
+    if _features is not None and row < len(_features):
+        return int(_features[row])
+    mask = _feature_cache.get(row)
+    if mask is None:
+        mask = _feature_cache[row] = FEATURE_AUTOMATON.scan(_store.feature_text(row))
+    return mask
+
+def render_chunk(items: List[RenderItem]) -> List[str]:
+    """Render one chunk into serialized JSONL lines (runs in a worker process)."""
+    lines = []
+    for profile_id, profile_text, matches in items:
+        rendered = []
+        for listing_id, score in matches:
+            row = _store.row_of(listing_id)
+            if row is None:
+                raise ValueError(f"Unknown listing id: '{listing_id}'")
+            md = _store[row].metadata
+            rendered.append({
+                "listing_id": listing_id,
+                "score": score,
+                "personalized_description": heuristic_personalization(profile_text, md, feature_mask=_feature_mask(row)),
+            })
+        lines.append(json.dumps({"id": profile_id, "matches": rendered}) + "\n")
+    return lines
+
+def iter_render_items(profiles_path: str, matches_path: str) -> Iterator[RenderItem]:
+    with open(matches_path, 'r', encoding='utf-8') as matches_file:
+        match_lines = (json.loads(line) for line in matches_file if line.strip())
+        for chunk in iter_profile_chunks(profiles_path, 1024):
+            for profile_id, text in chunk:
+                record = next(match_lines, None)
+                if record is None or record["id"] != profile_id:
+                    raise SystemExit(f"{matches_path} does not line up with {profiles_path} at profile '{profile_id}'")
+                yield profile_id, text, [(m["listing_id"], m["score"]) for m in record["matches"]]
+
+def iter_chunks(items: Iterator[RenderItem], chunk_size: int) -> Iterator[List[RenderItem]]:
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def render_batch(listings_path: str, added: List[dict], profiles_path: str, matches_path: str,
+                 out: TextIO, workers: int, chunk_size: int, dedup: Optional[dict] = None,
+                 snapshot_dir: Optional[str] = None) -> int:
+    """Render every matched profile to `out` in input order; returns profiles rendered."""
+    chunks = iter_chunks(iter_render_items(profiles_path, matches_path), chunk_size)
+    rendered = 0
+    if workers <= 1:
+        _init_worker(listings_path, added, dedup, snapshot_dir)
+        for chunk in chunks:
+            out.writelines(render_chunk(chunk))
+            rendered += len(chunk)
+        return rendered
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(listings_path, added, dedup, snapshot_dir)) as pool:
+        # Keep a bounded window of chunks in flight and write them strictly in order.
+        window = deque()
+        for chunk in chunks:
+            window.append((len(chunk), pool.submit(render_chunk, chunk)))
+            if len(window) >= workers * 2:
+                n, future = window.popleft()
+                out.writelines(future.result())
+                rendered += n
+        while window:
+            n, future = window.popleft()
+            out.writelines(future.result())
+            rendered += n
+    return rendered
@@ -0,0 +1,90 @@
+"""Exact top-k selection for offline HomeMatch retrieval, ties broken by listing index."""
+import heapq
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+def select_top_k(ids: np.ndarray, vals: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the k best (ids, vals), ordered by score desc then id asc."""
+    ids = np.asarray(ids)
+    vals = np.asarray(vals)
+    if k <= 0:
+        return ids[:0], vals[:0]
+    if len(vals) > k:
+        kth = np.partition(vals, len(vals) - k)[len(vals) - k]
+        above = vals > kth
+        # Break ties at the cut-off by lowest id, independent of partition order.
+        n_ties = k - int(above.sum())
+        tie_ids = np.sort(ids[vals == kth])[:n_ties]
+        ids = np.concatenate([ids[above], tie_ids])
+        vals = np.concatenate([vals[above], np.full(n_ties, kth, dtype=vals.dtype)])
+    order = np.lexsort((ids, -vals))
+    return ids[order], vals[order]
+
+def top_k_from_scores(scores: np.ndarray, k: int, offset: int = 0) -> List[Tuple[int, float]]:
+    """Top-k (doc, score) pairs from a dense score vector whose first row is `offset`."""
+    ids, vals = select_top_k(np.arange(offset, offset + len(scores)), scores, k)
+    return [(int(i), float(v)) for i, v in zip(ids, vals)]
+
+def top_k_from_row(cols: np.ndarray, vals: np.ndarray, n_docs: int, k: int) -> List[Tuple[int, float]]:
+    """Top-k (doc, score) pairs from one sparse score row, padded like dense scoring."""
+    pos = vals > 0
+    ids, top_vals = select_top_k(np.asarray(cols)[pos], np.asarray(vals)[pos], k)
+    top = [(int(i), float(v)) for i, v in zip(ids, top_vals)]
+    if len(top) < min(k, n_docs):
+        seen = set(i for i, _ in top)
+        for doc in range(n_docs):
+            if len(top) >= min(k, n_docs):
+                break
+            if doc not in seen:
+                top.append((doc, 0.0))
+    return top
+
+def query_vector(vectorizer, query: str) -> np.ndarray:
+    """Dense, L2-normalized TF-IDF vector for a query."""
+    return np.asarray(vectorizer.transform([query]).toarray()).ravel()
+
+def iter_row_shards(X, shard_rows: int) -> Iterator[Tuple[int, sparse.csr_matrix]]:
+    """Yield (row_offset, block) row shards of a CSR matrix."""
+    n_rows, n_cols = X.shape
+    indptr = X.indptr
+    for start in range(0, n_rows, shard_rows):
+        end = min(start + shard_rows, n_rows)
+        lo, hi = int(indptr[start]), int(indptr[end])
+        block_indptr = np.asarray(indptr[start:end + 1]) - lo
+        block = sparse.csr_matrix(
+            (X.data[lo:hi], X.indices[lo:hi], block_indptr),
+            shape=(end - start, n_cols), copy=False,
+        )
+        yield start, block
+
+def top_k_for_rows(X, q: np.ndarray, rows: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Top-k over a sorted subset of rows; only those rows of X are scored."""
+    scores = X[rows].dot(q[:X.shape[1]]) if len(rows) else np.zeros(0)
+    ids, vals = select_top_k(rows, scores, k)
+    return [(int(i), float(v)) for i, v in zip(ids, vals)]
+
+def streaming_top_k(q: np.ndarray, shards: Iterable[Tuple[int, sparse.csr_matrix]], k: int,
+                    candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """
+    Exact top-k over row shards, merging per-shard winners through a bounded min-heap.
+    With `candidates` (sorted row ids) only those rows are scored.
+    """
+    heap: List[Tuple[float, int]] = []  # (score, -doc): the root is the current k-th best
+    for offset, block in shards:
+        if candidates is None:
+            shard_top = top_k_from_scores(block.dot(q[:block.shape[1]]), k, offset)
+        else:
+            lo, hi = np.searchsorted(candidates, [offset, offset + block.shape[0]])
+            if lo == hi:
+                continue
+            shard_top = [(doc + offset, score) for doc, score in
+                         top_k_for_rows(block, q, candidates[lo:hi] - offset, k)]
+        for doc, score in shard_top:
+            item = (score, -doc)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return [(-neg_doc, score) for score, neg_doc in sorted(heap, reverse=True)]
@@ -0,0 +1,215 @@
+"""Long-running asyncio HTTP/JSON query server for offline HomeMatch (GET /health, POST /match)."""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from homematch_index import source_stat
+from homematch_offline import (
+    OfflineIndex, finish_incremental_index, format_buyer_profile, heuristic_personalization,
+    open_offline_index, retrieve_top_k, select_candidates,
+)
+from listing_store import FILTER_FIELDS, NUMERIC_FIELDS
+
+MAX_BODY_BYTES = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+@dataclass
+class ServingState:
+    index: OfflineIndex
+    generation: int
+    source_stat: Tuple[int, int]
+    loaded_at: float
+
+def parse_filters(filters: dict) -> dict:
+    """Map {"min_price": ..., "max_sqft": ...} onto inclusive (lo, hi) ranges per store column."""
+    ranges = {name: [None, None] for name in NUMERIC_FIELDS}
+    for key, value in (filters or {}).items():
+        bound, _, field = key.partition("_")
+        if bound not in ("min", "max") or field not in FILTER_FIELDS:
+            raise RequestError(400, f"Unknown filter '{key}'")
+        try:
+            ranges[FILTER_FIELDS[field]][0 if bound == "min" else 1] = float(value)
+        except (TypeError, ValueError):
+            raise RequestError(400, f"Filter '{key}' must be a number")
+    return {name: tuple(r) for name, r in ranges.items()}
+
+class HomeMatchServer:
+    def __init__(self, args, listings_path: str):
+        self.args = args
+        self.listings_path = listings_path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="homematch-query")
+        # Rebuilds get their own thread so a long refit never starves query workers.
+        self.reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="homematch-reload")
+        self.state: Optional[ServingState] = None
+        self._pending_stat: Optional[Tuple[int, int]] = None
+
+    def load_state(self, generation: int) -> ServingState:
+        stat = source_stat(self.listings_path)
+        index = open_offline_index(self.args, self.listings_path, background=True)
+        if index.incremental is not None:
+            # Queries keep being served while a compaction runs; its result is saved once it is done.
+            self.reload_executor.submit(finish_incremental_index, index.incremental, index.snapshot,
+                                        len(index.logged_ops))
+        return ServingState(index=index, generation=generation, source_stat=stat, loaded_at=time.time())
+
+    def match(self, state: ServingState, payload: dict) -> dict:
+        """Retrieve and render matches for one request (runs on the query thread)."""
+        if "profile" in payload:
+            profile = str(payload["profile"])
+        elif isinstance(payload.get("answers"), list):
+            profile = format_buyer_profile([str(a) for a in payload["answers"]])
+        else:
+            raise RequestError(400, "Expected a 'profile' string or an 'answers' list")
+        try:
+            k = int(payload.get("k", 3))
+        except (TypeError, ValueError):
+            raise RequestError(400, "'k' must be an integer")
+        if k < 1:
+            raise RequestError(400, "'k' must be at least 1")
+        required = payload.get("require_features") or []
+        if not isinstance(required, list):
+            raise RequestError(400, "'require_features' must be a list")
+
+        oi = state.index
+        try:
+            candidates = select_candidates(oi, parse_filters(payload.get("filters")), [str(f) for f in required])
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        if oi.incremental is not None:
+            top_idx = [row for row, _ in oi.incremental.search(profile, k, candidates)]
+        else:
+            top_idx = retrieve_top_k(oi.vectorizer, oi.X, profile, k, candidates=candidates)
+
+        matches = []
+        for idx in top_idx:
+            md = oi.docs[idx].metadata
+            match = {key: md[key] for key in ("id", "neighborhood", "price", "bedrooms", "bathrooms", "house_size_sqft")}
+            if payload.get("personalize", True):
+                match["personalized_description"] = heuristic_personalization(
+                    profile, md, feature_mask=int(oi.features[idx]))
+            matches.append(match)
+        return {"generation": state.generation, "matches": matches}
+
+    async def watch(self) -> None:
+        """Poll the listings file and swap in a rebuilt index once a change has settled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.args.watch_interval)
+            try:
+                stat = source_stat(self.listings_path)
+            except OSError:
+                continue
+            if stat == self.state.source_stat:
+                self._pending_stat = None
+                continue
+            if stat != self._pending_stat:
+                # Wait one more interval so a file that is still being written is not read.
+                self._pending_stat = stat
+                continue
+            try:
+                new_state = await loop.run_in_executor(self.reload_executor, self.load_state, self.state.generation + 1)
+            except Exception as e:
+                print(f"Reload of {self.listings_path} failed, still serving generation {self.state.generation}: {e}")
+                continue
+            self.state = new_state
+            self._pending_stat = None
+            print(f"Reloaded {self.listings_path}: generation {new_state.generation}, {len(new_state.index.docs)} listings.")
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        state = self.state  # pin the index for the whole request
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(405, "Use GET")
+            return 200, {"status": "ok", "generation": state.generation, "listings": len(state.index.docs)}
+        if path == "/match":
+            if method != "POST":
+                raise RequestError(405, "Use POST")
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise RequestError(400, "Body must be JSON")
+            if not isinstance(payload, dict):
+                raise RequestError(400, "Body must be a JSON object")
+            loop = asyncio.get_running_loop()
+            return 200, await loop.run_in_executor(self.executor, self.match, state, payload)
+        raise RequestError(404, f"No route for {path}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                try:
+                    try:
+                        length = int(headers.get("content-length", "0"))
+                    except ValueError:
+                        keep_alive = False
+                        raise RequestError(400, "Invalid Content-Length")
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise RequestError(413, "Request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.route(method, target.split("?", 1)[0], body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.state = await loop.run_in_executor(self.reload_executor, self.load_state, 1)
+        server = await asyncio.start_server(self.handle_connection, self.args.host, self.args.port)
+        watcher = asyncio.create_task(self.watch())
+        print(f"HomeMatch offline server listening on http://{self.args.host}:{self.args.port} "
+              f"({len(self.state.index.docs)} listings).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=True)
+            self.reload_executor.shutdown(wait=False)
+
+def serve(args, listings_path: str) -> None:
+    try:
+        asyncio.run(HomeMatchServer(args, listings_path).run())
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
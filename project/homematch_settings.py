@@ -0,0 +1,105 @@
+"""HomeMatch online app settings, read from the HOMEMATCH_* environment variables in one place."""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from homematch_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_RESPONSE_CACHE_PATH, DEFAULT_RESPONSE_ENTRIES, DEFAULT_RESPONSE_TTL,
+)
+from homematch_hnsw import hnsw_settings
+from homematch_hybrid import HYBRID_CANDIDATES
+from homematch_ingest import MAX_REQUEST_TOKENS, WRITE_BATCH
+from homematch_metrics import DEFAULT_METRICS_PATH, DEFAULT_TRACE_PATH
+from listing_store import FILTER_FIELDS
+from near_duplicates import DEDUP_SETTINGS
+
+VECTOR_DB_MODES = ("sync", "rebuild")
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+def _env(name: str, default: str = "") -> str:
+    return os.getenv(f"HOMEMATCH_{name}", default)
+
+def _number(name: str, default, kind=float):
+    value = _env(name, str(default))
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"HOMEMATCH_{name} must be a number, got {value!r}") from None
+
+def _choice(name: str, default: str, choices: Tuple[str, ...]) -> str:
+    value = _env(name, default)
+    if value not in choices:
+        raise ValueError(f"HOMEMATCH_{name} must be one of {', '.join(choices)}.")
+    return value
+
+@dataclass
+class AppSettings:
+    chat_model: str
+    embed_model: str
+    retrieval: str                  # "vector" or "hybrid"
+    vector_db_mode: str             # "sync" or "rebuild"
+    top_k: int
+    ranges: Dict[str, Tuple[Optional[float], Optional[float]]]  # inclusive (lo, hi) per store column
+    hnsw: dict
+    dedup: Optional[dict]           # near-duplicate settings (None = keep every listing)
+    hybrid_candidates: int
+    embedding_cache: str
+    embed_batch_tokens: int
+    embed_concurrency: int
+    embed_rpm: float
+    embed_tpm: float
+    write_batch: int
+    concurrency: int
+    rpm: float
+    tpm: float
+    max_retries: int
+    stream: bool
+    response_cache: str
+    response_ttl: float             # seconds; 0 disables the response cache
+    response_cache_size: int
+    trace_path: str                 # empty = no trace file
+    metrics_path: str               # empty = no metrics file
+
+    @classmethod
+    def from_env(cls) -> "AppSettings":
+        """Read the settings from the environment; a malformed value raises ValueError naming its variable."""
+        ranges = {}
+        for field, column in FILTER_FIELDS.items():
+            bounds = [_env(f"{bound}_{field.upper()}") for bound in ("MIN", "MAX")]
+            try:
+                ranges[column] = tuple(float(b) if b else None for b in bounds)
+            except ValueError:
+                raise ValueError("HOMEMATCH_MIN_*/HOMEMATCH_MAX_* filters must be numbers.") from None
+        try:
+            hnsw = hnsw_settings(space=_env("HNSW_SPACE") or None, M=_env("HNSW_M") or None,
+                                 construction_ef=_env("HNSW_EF_CONSTRUCTION") or None,
+                                 search_ef=_env("HNSW_EF_SEARCH") or None)
+        except ValueError as e:
+            raise ValueError(f"Invalid HOMEMATCH_HNSW_* setting: {e}") from None
+        return cls(
+            chat_model=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            embed_model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
+            retrieval=_choice("RETRIEVAL", "vector", RETRIEVAL_MODES),
+            vector_db_mode=_choice("VECTOR_DB_MODE", "sync", VECTOR_DB_MODES),
+            top_k=_number("TOP_K", 3, int),
+            ranges=ranges,
+            hnsw=hnsw,
+            dedup=None if _env("DEDUPE", "1") == "0" else DEDUP_SETTINGS,
+            hybrid_candidates=_number("HYBRID_CANDIDATES", HYBRID_CANDIDATES, int),
+            embedding_cache=_env("EMBEDDING_CACHE", DEFAULT_CACHE_PATH),
+            embed_batch_tokens=_number("EMBED_BATCH_TOKENS", MAX_REQUEST_TOKENS, int),
+            embed_concurrency=_number("EMBED_CONCURRENCY", 4, int),
+            embed_rpm=_number("EMBED_RPM", 0),
+            embed_tpm=_number("EMBED_TPM", 0),
+            write_batch=_number("WRITE_BATCH", WRITE_BATCH, int),
+            concurrency=_number("CONCURRENCY", 4, int),
+            rpm=_number("RPM", 0),
+            tpm=_number("TPM", 0),
+            max_retries=_number("MAX_RETRIES", 3, int),
+            stream=_env("STREAM", "0") == "1",
+            response_cache=_env("RESPONSE_CACHE", DEFAULT_RESPONSE_CACHE_PATH),
+            response_ttl=_number("RESPONSE_TTL", DEFAULT_RESPONSE_TTL),
+            response_cache_size=_number("RESPONSE_CACHE_SIZE", DEFAULT_RESPONSE_ENTRIES, int),
+            trace_path=_env("TRACE", DEFAULT_TRACE_PATH),
+            metrics_path=_env("METRICS", DEFAULT_METRICS_PATH),
+        )
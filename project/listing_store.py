@@ -0,0 +1,433 @@
+"""Columnar, compact in-memory store for HomeMatch listings."""
+import bisect
+import json
+import mmap
+import os
+import re
+import sys
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from near_duplicates import find_near_duplicates, listing_text
+
+NUMERIC_FIELDS = ("price", "bedrooms", "bathrooms", "house_size_sqft")
+# min_/max_ filter suffix -> store column, shared by the online app and the offline server.
+FILTER_FIELDS = {"price": "price", "bedrooms": "bedrooms", "bathrooms": "bathrooms", "sqft": "house_size_sqft"}
+METADATA_KEYS = (
+    "id", "neighborhood", "price", "bedrooms", "bathrooms", "house_size_sqft",
+    "full_description", "neighborhood_description",
+)
+
+def parse_listing_id(listing_id: str) -> int:
+    prefix, _, n = listing_id.rpartition("_")
+    if prefix != "listing" or not n.isdigit():
+        raise ValueError(f"Not a listing id: '{listing_id}'")
+    return int(n)
+
+_READ_CHARS = 1 << 20
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+class _JsonStream:
+    """Decodes one JSON value at a time from a text file, holding about one read block."""
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(_READ_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number ending the buffer may continue in the next block.
+            if end < len(self.buf) or self.eof or not self._fill():
+                self.pos = end
+                return value
+
+def iter_listings(path: str) -> Iterator[dict]:
+    """Stream the listings of a `{"listings": [...]}` file one dict at a time."""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        stream.expect("{")
+        while stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            if key != "listings":
+                stream.value()
+            else:
+                stream.expect("[")
+                if stream.peek() == "]":
+                    return
+                while True:
+                    yield stream.value()
+                    separator = stream.peek()
+                    stream.expect(separator if separator in ",]" else ",")
+                    if separator == "]":
+                        return
+            if stream.peek() == ",":
+                stream.pos += 1
+    raise KeyError("listings")
+
+def _int_rows(col: np.ndarray, int_rows: Optional[np.ndarray]) -> np.ndarray:
+    """Rows of a numeric column whose JSON value was an int."""
+    if np.issubdtype(col.dtype, np.integer):
+        return np.ones(len(col), dtype=bool)
+    return int_rows if int_rows is not None else np.zeros(len(col), dtype=bool)
+
+class ListingRow(Mapping):
+    """Read-only metadata view of one listing; values are decoded on access."""
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ListingStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        store, row = self._store, self._row
+        if key == "id":
+            return store.listing_id(row)
+        if key == "neighborhood":
+            return store.neighborhoods[store.neighborhood_codes[row]]
+        if key in NUMERIC_FIELDS:
+            value = store.columns[key][row].item()
+            int_rows = store.int_rows.get(key)
+            return int(value) if int_rows is not None and int_rows[row] else value
+        if key == "full_description":
+            return store.text(row, 0)
+        if key == "neighborhood_description":
+            return store.text(row, 1)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(METADATA_KEYS)
+
+    def __len__(self) -> int:
+        return len(METADATA_KEYS)
+
+class ListingView:
+    """Document-like view with `page_content` and `metadata`, built lazily."""
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ListingStore", row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def page_content(self) -> str:
+        return self._store.page_content(self._row)
+
+    @property
+    def metadata(self) -> ListingRow:
+        return ListingRow(self._store, self._row)
+
+class NumericIndex:
+    """Per-field stable argsort orders over the numeric columns; a range is two binary searches."""
+    def __init__(self, columns: Dict[str, np.ndarray], order: Optional[Dict[str, np.ndarray]] = None):
+        self.columns = columns
+        self.order = order or {name: np.argsort(col, kind='stable') for name, col in columns.items()}
+
+    def _bounds(self, name: str, lo, hi) -> Tuple[int, int]:
+        values, order = self.columns[name], self.order[name]
+        start = 0 if lo is None else int(np.searchsorted(values, lo, side='left', sorter=order))
+        end = len(values) if hi is None else int(np.searchsorted(values, hi, side='right', sorter=order))
+        return start, max(start, end)
+
+    def filter_rows(self, ranges: Dict[str, Tuple[Optional[float], Optional[float]]]) -> Optional[np.ndarray]:
+        """Sorted row ids satisfying every inclusive (lo, hi) range, or None when no range is constrained."""
+        ranges = {name: r for name, r in ranges.items() if r[0] is not None or r[1] is not None}
+        if not ranges:
+            return None
+        bounds = {name: self._bounds(name, lo, hi) for name, (lo, hi) in ranges.items()}
+        driver = min(bounds, key=lambda name: bounds[name][1] - bounds[name][0])
+        start, end = bounds[driver]
+        rows = self.order[driver][start:end]
+        for name, (lo, hi) in ranges.items():
+            if name == driver or len(rows) == 0:
+                continue
+            values = self.columns[name][rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if lo is not None:
+                keep &= values >= lo
+            if hi is not None:
+                keep &= values <= hi
+            rows = rows[keep]
+        return np.sort(rows)
+
+class ListingStore(Sequence):
+    """Columnar listing storage; indexing returns a `ListingView`."""
+    TEXT_FIELDS = 2  # description, neighborhood_description
+    n_dropped = 0    # near-duplicates dropped by `load`
+
+    def __init__(self, columns: Dict[str, np.ndarray], neighborhood_codes: np.ndarray,
+                 neighborhoods: List[str], text: bytes, text_offsets: np.ndarray,
+                 ids: Optional[np.ndarray] = None, next_id: Optional[int] = None,
+                 int_rows: Optional[Dict[str, np.ndarray]] = None,
+                 orders: Optional[Dict[str, np.ndarray]] = None):
+        self.columns = columns
+        # Per float column holding JSON ints too: which rows were ints, so 2 and 2.0 read back as loaded.
+        self.int_rows = int_rows or {}
+        self.neighborhood_codes = neighborhood_codes
+        self.neighborhoods = neighborhoods
+        # (first_row, buffer, offsets) per text block; block_starts mirrors first_row for bisect.
+        self._text_blocks: List[Tuple[int, bytes, np.ndarray]] = [(0, text, text_offsets)]
+        self._block_starts: List[int] = [0]
+        self._numeric_index: Optional[NumericIndex] = None
+        self._orders = orders  # NumericIndex permutations read by `open`
+        self.ids = ids  # sorted listing id number per row; None = the row itself
+        # Id number for the next appended listing; past every source position, dropped ones included.
+        self.next_id = len(self) if next_id is None else int(next_id)
+
+    @classmethod
+    def from_listings(cls, listings: Iterable[dict]) -> "ListingStore":
+        values: Dict[str, list] = {name: [] for name in NUMERIC_FIELDS}
+        codes: List[int] = []
+        neighborhoods: List[str] = []
+        code_of: Dict[str, int] = {}
+        chunks: List[bytes] = []
+        offsets = [0]
+        for listing in listings:
+            for name in NUMERIC_FIELDS:
+                values[name].append(listing[name])
+            name = listing['neighborhood']
+            if name not in code_of:
+                code_of[name] = len(neighborhoods)
+                neighborhoods.append(sys.intern(name))
+            codes.append(code_of[name])
+            for field in ('description', 'neighborhood_description'):
+                encoded = listing[field].encode('utf-8')
+                chunks.append(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        columns = {name: np.asarray(vals) for name, vals in values.items()}
+        int_rows = {}
+        for name, col in columns.items():
+            if np.issubdtype(col.dtype, np.floating):
+                mask = np.fromiter((isinstance(v, int) for v in values[name]), dtype=bool, count=len(col))
+                if mask.any():
+                    int_rows[name] = mask
+        return cls(
+            columns=columns,
+            neighborhood_codes=np.asarray(codes, dtype=np.int32),
+            neighborhoods=neighborhoods,
+            text=b"".join(chunks),
+            text_offsets=np.asarray(offsets, dtype=np.int64),
+            int_rows=int_rows,
+        )
+
+    @classmethod
+    def load(cls, path: str, dedup: Optional[dict] = None, kept: Optional[np.ndarray] = None) -> "ListingStore":
+        """
+        Stream a listings JSON file into the columns, keeping one listing per near-duplicate cluster with `dedup`.
+        `kept`, the positions an earlier run kept from the same file, skips the dedup pass.
+        """
+        if dedup is None:
+            return cls.from_listings(iter_listings(path))
+        if kept is None:
+            representative = find_near_duplicates((listing_text(l) for l in iter_listings(path)), dedup)
+            kept = np.flatnonzero(representative == np.arange(len(representative)))
+        positions = np.asarray(kept, dtype=np.int64)
+        total = 0
+
+        def selected() -> Iterator[dict]:
+            nonlocal total
+            wanted = iter(positions.tolist())
+            next_kept = next(wanted, None)
+            for i, listing in enumerate(iter_listings(path)):
+                total = i + 1
+                if i == next_kept:
+                    yield listing
+                    next_kept = next(wanted, None)
+
+        store = cls.from_listings(selected())
+        store.n_dropped = total - len(store)
+        if store.n_dropped:
+            store.ids = positions
+            store.next_id = total
+        return store
+
+    def save(self, directory: str) -> None:
+        """Write the columns, their sort orders and a single merged text buffer as files `open` can memory-map."""
+        os.makedirs(directory, exist_ok=True)
+        for name, col in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), col)
+            np.save(os.path.join(directory, f"{name}.order.npy"), self.numeric_index.order[name])
+            int_rows_path = os.path.join(directory, f"{name}.int_rows.npy")
+            if name in self.int_rows:
+                np.save(int_rows_path, self.int_rows[name])
+            elif os.path.exists(int_rows_path):
+                os.remove(int_rows_path)
+        np.save(os.path.join(directory, "neighborhood_codes.npy"), self.neighborhood_codes)
+        with open(os.path.join(directory, "neighborhoods.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.neighborhoods, f)
+        offsets, base = [np.zeros(1, dtype=np.int64)], 0
+        with open(os.path.join(directory, "text.bin"), 'wb') as f:
+            for _, text, block_offsets in self._text_blocks:
+                f.write(text)
+                offsets.append(np.asarray(block_offsets[1:], dtype=np.int64) + base)
+                base += len(text)
+        np.save(os.path.join(directory, "text_offsets.npy"), np.concatenate(offsets))
+        ids_path = os.path.join(directory, "ids.npy")
+        if self.ids is not None:
+            np.save(ids_path, self.ids)
+        elif os.path.exists(ids_path):
+            os.remove(ids_path)
+        with open(os.path.join(directory, "store.json"), 'w', encoding='utf-8') as f:
+            json.dump({"next_id": self.next_id}, f)
+
+    @classmethod
+    def open(cls, directory: str, mmap_mode: bool = True) -> "ListingStore":
+        """Open a store written by `save`; arrays and text are memory-mapped unless `mmap_mode` is False."""
+        mode = "r" if mmap_mode else None
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in NUMERIC_FIELDS}
+        int_rows = {name: np.load(os.path.join(directory, f"{name}.int_rows.npy"), mmap_mode=mode)
+                    for name in NUMERIC_FIELDS if os.path.exists(os.path.join(directory, f"{name}.int_rows.npy"))}
+        with open(os.path.join(directory, "neighborhoods.json"), 'r', encoding='utf-8') as f:
+            neighborhoods = [sys.intern(n) for n in json.load(f)]
+        with open(os.path.join(directory, "text.bin"), 'rb') as f:
+            if mmap_mode and os.fstat(f.fileno()).st_size:
+                text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                text = f.read()
+        ids_path = os.path.join(directory, "ids.npy")
+        with open(os.path.join(directory, "store.json"), 'r', encoding='utf-8') as f:
+            next_id = json.load(f)["next_id"]
+        order_paths = {name: os.path.join(directory, f"{name}.order.npy") for name in NUMERIC_FIELDS}
+        orders = ({name: np.load(p, mmap_mode=mode) for name, p in order_paths.items()}
+                  if all(map(os.path.exists, order_paths.values())) else None)
+        return cls(
+            columns=columns,
+            neighborhood_codes=np.load(os.path.join(directory, "neighborhood_codes.npy"), mmap_mode=mode),
+            neighborhoods=neighborhoods,
+            text=text,
+            text_offsets=np.load(os.path.join(directory, "text_offsets.npy"), mmap_mode=mode),
+            ids=np.load(ids_path) if os.path.exists(ids_path) else None,
+            next_id=next_id,
+            int_rows=int_rows,
+            orders=orders,
+        )
+
+    def extend(self, listings: Iterable[dict]) -> range:
+        """Append listings (same schema as the JSON file); returns their new row range."""
+        first_row = len(self)
+        delta = ListingStore.from_listings(listings)
+        if not len(delta):
+            return range(first_row, first_row)
+        code_of = {name: code for code, name in enumerate(self.neighborhoods)}
+        remap = np.empty(len(delta.neighborhoods), dtype=np.int32)
+        for code, name in enumerate(delta.neighborhoods):
+            if name not in code_of:
+                code_of[name] = len(self.neighborhoods)
+                self.neighborhoods.append(name)
+            remap[code] = code_of[name]
+        self.neighborhood_codes = np.concatenate([self.neighborhood_codes, remap[delta.neighborhood_codes]])
+        columns = {name: np.concatenate([col, delta.columns[name]]) for name, col in self.columns.items()}
+        int_rows = {}
+        for name, col in columns.items():
+            if np.issubdtype(col.dtype, np.floating):
+                mask = np.concatenate([_int_rows(self.columns[name], self.int_rows.get(name)),
+                                       _int_rows(delta.columns[name], delta.int_rows.get(name))])
+                if mask.any():
+                    int_rows[name] = mask
+        self.columns, self.int_rows = columns, int_rows
+        if self.ids is not None:
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(delta), dtype=self.ids.dtype)])
+        self.next_id += len(delta)
+        _, text, offsets = delta._text_blocks[0]
+        self._text_blocks.append((first_row, text, offsets))
+        self._block_starts.append(first_row)
+        self._numeric_index = self._orders = None
+        return range(first_row, len(self))
+
+    def __len__(self) -> int:
+        return len(self.neighborhood_codes)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [ListingView(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("listing index out of range")
+        return ListingView(self, row)
+
+    @property
+    def numeric_index(self) -> NumericIndex:
+        if self._numeric_index is None:
+            self._numeric_index = NumericIndex(self.columns, self._orders)
+        return self._numeric_index
+
+    def listing_id(self, row: int) -> str:
+        return f"listing_{row if self.ids is None else int(self.ids[row])}"
+
+    def row_of(self, listing_id: str) -> Optional[int]:
+        """Row of a listing id, or None when no row has it (raises ValueError for a malformed id)."""
+        n = parse_listing_id(listing_id)
+        if self.ids is None:
+            return n if n < len(self) else None
+        row = int(np.searchsorted(self.ids, n))
+        return row if row < len(self.ids) and self.ids[row] == n else None
+
+    def text(self, row: int, field: int) -> str:
+        if len(self._text_blocks) == 1:
+            first_row, text, offsets = self._text_blocks[0]
+        else:
+            first_row, text, offsets = self._text_blocks[bisect.bisect_right(self._block_starts, row) - 1]
+        slot = (row - first_row) * self.TEXT_FIELDS + field
+        start, end = offsets[slot], offsets[slot + 1]
+        return text[start:end].decode('utf-8')
+
+    def page_content(self, row: int) -> str:
+        return (
+            f"Property Description: {self.text(row, 0)}\n"
+            f"Neighborhood: {self.text(row, 1)}"
+        )
+
+    def feature_text(self, row: int) -> str:
+        """Description plus neighborhood text, as scanned for feature keywords."""
+        return (self.text(row, 0) + "\n" + self.text(row, 1)).strip()
+
+    def feature_texts(self) -> Iterator[str]:
+        return (self.feature_text(i) for i in range(len(self)))
+
+    def page_contents(self) -> Iterator[str]:
+        return (self.page_content(i) for i in range(len(self)))
+
+    def nbytes(self) -> int:
+        """Approximate resident size of the columnar data."""
+        total = self.neighborhood_codes.nbytes
+        total += sum(len(text) + offsets.nbytes for _, text, offsets in self._text_blocks)
+        total += sum(col.nbytes for col in self.columns.values())
+        total += sum(mask.nbytes for mask in self.int_rows.values())
+        total += self.ids.nbytes if self.ids is not None else 0
+        total += sum(sys.getsizeof(n) for n in self.neighborhoods)
+        return total
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Load test of the HomeMatch online paths against an OpenAI-compatible (by default the mock) server."""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional
+
+from benchmark_offline import environment, latency_summary
+from homematch_ingest import approx_tokens
+from mock_openai_server import add_fault_arguments
+from synthetic_listings import synthetic_profile_answers, write_synthetic_listings
+
+SCENARIOS = ("chat", "stream", "tools", "embed", "generate", "personalize", "ingest")
+RESULTS_SCHEMA = 1
+SERVER_START_TIMEOUT = 15.0
+SEARCH_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_listings",
+        "description": "Find listings matching a buyer's requirements.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "neighborhood": {"type": "string"},
+                "min_bedrooms": {"type": "integer", "minimum": 1, "maximum": 6},
+                "max_price": {"type": "integer", "minimum": 100000, "maximum": 3000000},
+            },
+            "required": ["min_bedrooms"],
+        },
+    },
+}
+
+def error_kind(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    return f"{type(error).__name__} ({status})" if status else type(error).__name__
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mock_server(args) -> subprocess.Popen:
+    """Start mock_openai_server.py with this run's fault flags and wait until it answers /health."""
+    port = free_port()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_openai_server.py")
+    cmd = [sys.executable, script, "--port", str(port), "--latency-ms", str(args.latency_ms),
+           "--jitter-ms", str(args.jitter_ms), "--token-ms", str(args.token_ms), "--rpm", str(args.rpm),
+           "--rate-limit-rate", str(args.rate_limit_rate), "--error-rate", str(args.error_rate),
+           "--completion-tokens", str(args.completion_tokens), "--dim", str(args.dim), "--seed", str(args.seed)]
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    args.base_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Mock server exited with status {server.returncode}.")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit(f"Mock server did not answer within {SERVER_START_TIMEOUT:g}s.")
+
+def server_stats(base_url: str) -> Optional[dict]:
+    """Request counts per route and status, if the server is the mock."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/stats", timeout=2) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+def scenario_result(name: str, requests: int, latencies: List[float], errors: Counter, seconds: float,
+                    **extra) -> dict:
+    result = {
+        "scenario": name,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else None,
+        "latency": latency_summary(latencies) if latencies else None,
+    }
+    result.update(extra)
+    return result
+
+async def run_requests(n: int, concurrency: int, call: Callable[[int], Awaitable[Optional[float]]]):
+    """
+    Run call(0..n-1) with at most `concurrency` in flight. Returns (latencies of
+    successful calls, first-token times they reported, errors by kind, wall seconds).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: Counter = Counter()
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                first_token = await call(i)
+            except Exception as e:
+                errors[error_kind(e)] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            if first_token is not None:
+                first_tokens.append(first_token - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies, first_tokens, errors, time.perf_counter() - started
+
+def listing_prompt(md: dict) -> str:
+    return (f"Write a short, inviting description of this {md['bedrooms']}-bedroom home in {md['neighborhood']} "
+            f"priced at ${md['price']:,}: {md['full_description']}")
+
+async def raw_scenario(name: str, args, docs) -> dict:
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(base_url=args.base_url, api_key=args.api_key, max_retries=0)
+    messages = lambda i: [{"role": "user", "content": listing_prompt(docs[i % len(docs)].metadata)}]
+
+    async def chat(i):
+        await client.chat.completions.create(model=args.chat_model, messages=messages(i), max_tokens=args.max_tokens)
+
+    async def stream(i):
+        first_token = None
+        response = await client.chat.completions.create(model=args.chat_model, messages=messages(i),
+                                                        max_tokens=args.max_tokens, stream=True,
+                                                        stream_options={"include_usage": True})
+        async for chunk in response:
+            if first_token is None and chunk.choices and chunk.choices[0].delta.content:
+                first_token = time.perf_counter()
+        return first_token
+
+    async def tools(i):
+        response = await client.chat.completions.create(model=args.chat_model, messages=messages(i),
+                                                        tools=[SEARCH_TOOL], tool_choice="auto")
+        calls = response.choices[0].message.tool_calls
+        if not calls:
+            raise ValueError("no tool call in the response")
+        json.loads(calls[0].function.arguments)
+
+    async def embed(i):
+        texts = [docs[(i * args.batch_size + j) % len(docs)].page_content for j in range(args.batch_size)]
+        await client.embeddings.create(model=args.embed_model, input=texts)
+
+    calls = {"chat": chat, "stream": stream, "tools": tools, "embed": embed}
+    latencies, first_tokens, errors, seconds = await run_requests(args.requests, args.concurrency, calls[name])
+    await client.close()
+    extra = {"ttft": latency_summary(first_tokens)} if first_tokens else {}
+    if name == "embed":
+        extra["inputs_per_s"] = round(len(latencies) * args.batch_size / seconds, 1) if seconds else None
+    return scenario_result(name, args.requests, latencies, errors, seconds, **extra)
+
+async def generate_scenario(args) -> dict:
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_openai import ChatOpenAI
+    os.environ.setdefault("OPENAI_API_KEY", args.api_key)  # generate_listings exits on import without one
+    from generate_listings import ListingCollection
+
+    parser = PydanticOutputParser(pydantic_object=ListingCollection)
+    prompt = ChatPromptTemplate.from_template(
+        "Create a diverse set of {n} realistic property listings.\n\n{format_instructions}",
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+    llm = ChatOpenAI(model=args.chat_model, temperature=0.7, base_url=args.base_url, api_key=args.api_key,
+                     max_retries=0)
+    chain = prompt | llm | parser
+
+    async def generate(i):
+        await chain.ainvoke({"n": 10 + i % 5})
+
+    latencies, _, errors, seconds = await run_requests(args.requests, args.concurrency, generate)
+    return scenario_result("generate", args.requests, latencies, errors, seconds)
+
+def span_latencies(metrics, name: str) -> List[float]:
+    return [s["seconds"] for s in metrics.spans if s["name"] == name and "error" not in s]
+
+async def personalize_scenario(args, docs) -> dict:
+    from langchain_openai import ChatOpenAI
+    from homematch_app import create_personalization_chain
+    from homematch_personalize import personalize_in_rank_order
+    from homematch_metrics import PipelineMetrics, UsageCallback
+    from rate_limit import AsyncRateLimiter
+
+    metrics = PipelineMetrics()
+    llm = ChatOpenAI(model=args.chat_model, temperature=0.5, base_url=args.base_url, api_key=args.api_key,
+                     max_retries=0, stream_usage=True, max_tokens=args.max_tokens)
+    chain = create_personalization_chain(llm, callbacks=[UsageCallback(metrics, approx_tokens)])
+    limiter = AsyncRateLimiter(args.client_rpm, args.client_tpm)
+    profile = "Buyer Profile:\n" + "\n".join(f"- {a}" for a in synthetic_profile_answers(0, args.seed))
+    selected = [docs[i % len(docs)] for i in range(args.requests)]
+    errors: Counter = Counter()
+    started = time.perf_counter()
+    done = 0
+    try:
+        async for _ in personalize_in_rank_order(chain, profile, selected, limiter, args.concurrency, args.retries):
+            done += 1
+    except Exception as e:
+        errors[f"gave up: {error_kind(e)}"] += 1
+    seconds = time.perf_counter() - started
+    if metrics.counters["llm_errors"]:
+        errors["retried"] = int(metrics.counters["llm_errors"])
+    result = scenario_result("personalize", args.requests, span_latencies(metrics, "llm_call"), errors, seconds,
+                             descriptions=done,
+                             prompt_tokens=int(metrics.counters["llm_prompt_tokens"]),
+                             completion_tokens=int(metrics.counters["llm_completion_tokens"]))
+    result["throughput_rps"] = round(done / seconds, 1) if seconds else None
+    return result
+
+async def ingest_scenario(args, docs) -> dict:
+    from homematch_personalize import RETRYABLE_ERRORS
+    from homematch_ingest import embedding_client, ingest
+    from homematch_metrics import InstrumentedEmbeddings, PipelineMetrics
+    from rate_limit import AsyncRateLimiter
+
+    metrics = PipelineMetrics()
+    embeddings = InstrumentedEmbeddings(
+        embedding_client(args.embed_model, base_url=args.base_url, api_key=args.api_key), metrics, approx_tokens)
+    items = [(str(i), doc.page_content, doc.metadata) for i, doc in enumerate(docs)]
+    errors: Counter = Counter()
+    stats = None
+    try:
+        stats = await ingest(items, embeddings, lambda *batch: None, approx_tokens,
+                             limiter=AsyncRateLimiter(args.client_rpm, args.client_tpm), concurrency=args.concurrency,
+                             retries=args.retries, retry_on=RETRYABLE_ERRORS, max_request_tokens=args.batch_tokens)
+    except Exception as e:
+        errors[f"gave up: {error_kind(e)}"] += 1
+    seconds = stats.seconds if stats else metrics.now()
+    # Failed attempts record embedding_request spans too, so attempts beyond the successful requests were retried.
+    latencies = span_latencies(metrics, "embedding_request")
+    succeeded = stats.requests if stats else 0
+    if len(latencies) > succeeded:
+        errors["retried"] = len(latencies) - succeeded
+    result = scenario_result("ingest", len(latencies), latencies, errors, seconds,
+                             listings=len(items), written=stats.written if stats else 0)
+    result["ok"] = succeeded
+    result["listings_per_s"] = round(stats.written / seconds, 1) if stats and seconds else None
+    return result
+
+async def run_scenario(name: str, args, docs) -> dict:
+    if name == "generate":
+        return await generate_scenario(args)
+    if name == "personalize":
+        return await personalize_scenario(args, docs)
+    if name == "ingest":
+        return await ingest_scenario(args, docs)
+    return await raw_scenario(name, args, docs)
+
+def load_documents(args):
+    from homematch_app import ListingDocuments
+    from listing_store import ListingStore
+    path = args.listings
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="homematch_loadtest_"), "listings.json")
+        write_synthetic_listings(path, args.n_listings, args.seed)
+    return ListingDocuments(ListingStore.load(path))
+
+def print_table(results: List[dict]) -> None:
+    print(f"\n{'scenario':<12} {'ok/total':>11} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9} {'ttft p50':>9} {'ttft p99':>9}  errors")
+    for r in results:
+        latency, ttft = r["latency"] or {}, r.get("ttft") or {}
+        errors = ", ".join(f"{kind}: {n}" for kind, n in r["errors"].items()) or "-"
+        cell = lambda d, key: f"{d[key]:>9.1f}" if key in d else f"{'-':>9}"
+        print(f"{r['scenario']:<12} {r['ok']:>5}/{r['requests']:<5} {r['throughput_rps'] or 0:>8.1f} "
+              f"{cell(latency, 'p50_ms')} {cell(latency, 'p99_ms')} {cell(ttft, 'p50_ms')} {cell(ttft, 'p99_ms')}  {errors}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test HomeMatch online paths against an OpenAI-compatible server")
+    ap.add_argument("--base-url", default=None, help="Server to test (default: start mock_openai_server.py)")
+    ap.add_argument("--api-key", default="mock", help="API key sent to the server")
+    ap.add_argument("--scenarios", default="chat,stream,tools,embed,generate,personalize,ingest",
+                    help=f"Comma-separated scenarios out of {', '.join(SCENARIOS)}")
+    ap.add_argument("--requests", type=int, default=200, help="Requests per scenario (listings for personalize)")
+    ap.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    ap.add_argument("--retries", type=int, default=3, help="Retries per call in the personalize and ingest pipelines")
+    ap.add_argument("--client-rpm", type=float, default=None, help="Client-side request limit for the pipelines")
+    ap.add_argument("--client-tpm", type=float, default=None, help="Client-side token limit for the pipelines")
+    ap.add_argument("--chat-model", default="gpt-3.5-turbo", help="Chat model name sent to the server")
+    ap.add_argument("--embed-model", default="text-embedding-3-small", help="Embedding model name sent to the server")
+    ap.add_argument("--max-tokens", type=int, default=120, help="max_tokens of chat requests")
+    ap.add_argument("--batch-size", type=int, default=64, help="Inputs per request in the embed scenario")
+    ap.add_argument("--batch-tokens", type=int, default=8000, help="Tokens per embedding request in the ingest scenario")
+    ap.add_argument("--listings", default=None, help="Listings JSON to use (default: synthetic listings)")
+    ap.add_argument("--n-listings", type=int, default=2000, help="Synthetic listings to generate")
+    ap.add_argument("--output", default="loadtest_results.json", help="JSON results file")
+    add_fault_arguments(ap)
+    args = ap.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)} (choose from {', '.join(SCENARIOS)}).")
+    docs = load_documents(args)
+
+    server = start_mock_server(args) if args.base_url is None else None
+    target = "mock server" if server else "server"
+    print(f"Load-testing {', '.join(scenarios)} against the {target} at {args.base_url} "
+          f"({args.requests} requests, concurrency {args.concurrency}, {len(docs)} listings).")
+    results = []
+    try:
+        for name in scenarios:
+            print(f"  {name}...", flush=True)
+            results.append(asyncio.run(run_scenario(name, args, docs)))
+        stats = server_stats(args.base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print_table(results)
+
+    faults = {key: getattr(args, key) for key in ("latency_ms", "jitter_ms", "token_ms", "rpm", "rate_limit_rate",
+                                                 "error_rate", "completion_tokens", "dim", "seed")}
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "environment": environment(),
+        "config": {"base_url": args.base_url if server is None else "mock", "faults": faults if server else None,
+                   "requests": args.requests, "concurrency": args.concurrency, "retries": args.retries,
+                   "listings": len(docs), "chat_model": args.chat_model, "embed_model": args.embed_model},
+        "results": results,
+        "server_stats": stats,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}.")
+
+if __name__ == "__main__":
+    main()
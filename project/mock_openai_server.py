@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Deterministic OpenAI-compatible stand-in server with fault injection, for load tests and offline runs."""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+
+MAX_BODY_BYTES = 16 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+MODELS = ("gpt-3.5-turbo", "gpt-4o-mini", "text-embedding-3-small", "text-embedding-ada-002")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]+")
+_SCHEMA_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0      # added to every response (time to first token when streaming)
+    jitter_ms: float = 0.0       # uniform extra latency in [0, jitter_ms]
+    token_ms: float = 0.0        # delay between streamed tokens
+    rpm: float = 0.0             # requests per minute before answering 429 (0 = unlimited)
+    rate_limit_rate: float = 0.0  # fraction of requests answered with a random 429
+    error_rate: float = 0.0      # fraction of requests answered with a 500
+    completion_tokens: int = 80  # reply length when the request sets no max_tokens
+    dim: int = 1536              # embedding dimensions when the request sets none
+    seed: int = 0
+
+class MockError(Exception):
+    def __init__(self, status: int, message: str, error_type: str, code: Optional[str] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+        self.code = code
+        self.retry_after = retry_after
+
+    def body(self) -> dict:
+        return {"error": {"message": str(self), "type": self.error_type, "param": None, "code": self.code}}
+
+def count_tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+def request_seed(*parts) -> int:
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):  # multimodal parts
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+def reply_words(prompt: str, n: int, seed: int) -> List[str]:
+    """`n` words drawn from the prompt, grouped into capitalized sentences."""
+    rng = random.Random(seed)
+    vocabulary = [w.lower() for w in _WORD_RE.findall(prompt)] or ["mock", "response", "text"]
+    words = []
+    for i in range(n):
+        word = rng.choice(vocabulary)
+        if i % 12 == 0:
+            word = word.capitalize()
+        if i % 12 == 11 or i == n - 1:
+            word += "."
+        words.append(word)
+    return words
+
+def example_from_schema(schema: dict, defs: dict, rng: random.Random, name: str = "value", depth: int = 0):
+    """A deterministic JSON instance of a (Pydantic-style) JSON schema."""
+    if "$ref" in schema:
+        schema = defs.get(schema["$ref"].rsplit("/", 1)[-1], {})
+    for key in ("anyOf", "oneOf", "allOf"):
+        if schema.get(key):
+            schema = next((s for s in schema[key] if s.get("type") != "null"), schema[key][0])
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type", "object" if "properties" in schema else "string")
+    if kind == "object" and depth < 6:
+        return {prop: example_from_schema(sub, defs, rng, prop, depth + 1)
+                for prop, sub in schema.get("properties", {}).items()}
+    if kind == "array" and depth < 6:
+        n = max(int(schema.get("minItems", 0)), 3)
+        return [example_from_schema(schema.get("items", {}), defs, rng, name, depth + 1) for _ in range(n)]
+    if kind == "integer":
+        return rng.randint(int(schema.get("minimum", 1)), int(schema.get("maximum", 1000)))
+    if kind == "number":
+        return round(rng.uniform(float(schema.get("minimum", 1)), float(schema.get("maximum", 1000))), 1)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return f"{name.replace('_', ' ')} {rng.randint(1, 999)}"
+
+def schema_in_prompt(prompt: str) -> Optional[dict]:
+    for block in _SCHEMA_RE.findall(prompt):
+        try:
+            schema = json.loads(block)
+        except ValueError:
+            continue
+        if isinstance(schema, dict) and "properties" in schema:
+            return schema
+    return None
+
+def embed_text(text, dim: int) -> np.ndarray:
+    """Hashed bag-of-words vector (token-id lists hash their ids), L2-normalized."""
+    tokens = [f"t{t}" for t in text] if isinstance(text, list) else _WORD_RE.findall(str(text).lower())
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokens or [str(text)]:
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+class MockOpenAIServer:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats: Counter = Counter()
+        self.started = time.time()
+        self._level = float(config.rpm)  # token bucket for --rpm
+        self._updated = time.monotonic()
+
+    # -- fault injection ---------------------------------------------------
+    def admit(self) -> None:
+        """Raise an injected 429/500, if this request gets one."""
+        cfg = self.config
+        if cfg.rpm:
+            now = time.monotonic()
+            self._level = min(cfg.rpm, self._level + (now - self._updated) * cfg.rpm / 60.0)
+            self._updated = now
+            if self._level < 1.0:
+                retry_after = (1.0 - self._level) * 60.0 / cfg.rpm
+                raise MockError(429, f"Rate limit reached: {cfg.rpm:g} requests per minute.", "requests",
+                                "rate_limit_exceeded", retry_after)
+            self._level -= 1.0
+        roll = self.rng.random()
+        if roll < cfg.rate_limit_rate:
+            raise MockError(429, "Injected rate limit.", "requests", "rate_limit_exceeded", 1.0)
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            raise MockError(500, "Injected server error.", "server_error")
+
+    async def delay(self) -> None:
+        cfg = self.config
+        seconds = (cfg.latency_ms + self.rng.uniform(0.0, cfg.jitter_ms)) / 1000.0
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    # -- endpoints ---------------------------------------------------------
+    def chat_completion(self, payload: dict) -> Tuple[dict, List[str]]:
+        """(completion object, content split into streamable pieces)."""
+        messages = payload.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise MockError(400, "'messages' must be a non-empty list", "invalid_request_error")
+        model = str(payload.get("model", MODELS[0]))
+        prompt = "\n".join(message_text(m) for m in messages)
+        seed = request_seed(model, messages, payload.get("tools"), payload.get("functions"))
+        rng = random.Random(seed)
+        max_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens") or self.config.completion_tokens
+        message = {"role": "assistant", "content": None}
+        finish = "stop"
+
+        tools = payload.get("tools") or []
+        functions = payload.get("functions") or []
+        choice = payload.get("tool_choice", payload.get("function_call", "auto"))
+        after_tool = messages[-1].get("role") in ("tool", "function")
+        if (tools or functions) and choice != "none" and not after_tool:
+            specs = [t.get("function", {}) for t in tools] or functions
+            forced = choice.get("function", choice).get("name") if isinstance(choice, dict) else None
+            spec = next((s for s in specs if s.get("name") == forced), specs[0])
+            params = spec.get("parameters") or {}
+            arguments = json.dumps(example_from_schema(params, params.get("$defs", {}), rng))
+            if tools:
+                message["tool_calls"] = [{"id": f"call_{seed % 10**12:012d}", "type": "function",
+                                          "function": {"name": spec.get("name"), "arguments": arguments}}]
+                finish = "tool_calls"
+            else:
+                message["function_call"] = {"name": spec.get("name"), "arguments": arguments}
+                finish = "function_call"
+            pieces: List[str] = []
+            completion = count_tokens(arguments)
+        else:
+            schema = schema_in_prompt(prompt)
+            response_format = payload.get("response_format") or {}
+            if schema is None and response_format.get("type") == "json_schema":
+                schema = response_format.get("json_schema", {}).get("schema")
+            if schema is not None:
+                text = json.dumps(example_from_schema(schema, schema.get("$defs", {}), rng), indent=2)
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+            else:
+                words = reply_words(prompt, int(max_tokens), seed)
+                if response_format.get("type") == "json_object":
+                    words = [json.dumps({"response": " ".join(words)})]
+                pieces = [w if i == 0 else " " + w for i, w in enumerate(words)]
+            message["content"] = "".join(pieces)
+            completion = len(pieces)
+
+        prompt_tokens = sum(4 + count_tokens(message_text(m)) for m in messages) + 3
+        return {
+            "id": f"chatcmpl-{seed % 10**16:016d}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "system_fingerprint": "fp_mock",
+            "choices": [{"index": 0, "message": message, "logprobs": None, "finish_reason": finish}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion,
+                      "total_tokens": prompt_tokens + completion},
+        }, pieces
+
+    async def stream_chat(self, completion: dict, pieces: List[str], include_usage: bool) -> AsyncIterator[bytes]:
+        base = {key: completion[key] for key in ("id", "created", "model", "system_fingerprint")}
+        base["object"] = "chat.completion.chunk"
+        message = completion["choices"][0]["message"]
+
+        def event(delta: dict, finish: Optional[str] = None) -> bytes:
+            chunk = dict(base, choices=[{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}])
+            return b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n"
+
+        yield event({"role": "assistant", "content": ""})
+        if message.get("tool_calls"):
+            call = message["tool_calls"][0]
+            yield event({"tool_calls": [dict(call, index=0)]})
+        elif message.get("function_call"):
+            yield event({"function_call": message["function_call"]})
+        for piece in pieces:
+            if self.config.token_ms:
+                await asyncio.sleep(self.config.token_ms / 1000.0)
+            yield event({"content": piece})
+        yield event({}, completion["choices"][0]["finish_reason"])
+        if include_usage:
+            yield b"data: " + json.dumps(dict(base, choices=[], usage=completion["usage"])).encode("utf-8") + b"\n\n"
+        yield b"data: [DONE]\n\n"
+
+    def embeddings(self, payload: dict) -> dict:
+        inputs = payload.get("input")
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        if not isinstance(inputs, list) or not inputs:
+            raise MockError(400, "'input' must be a string or a non-empty list", "invalid_request_error")
+        dim = int(payload.get("dimensions") or self.config.dim)
+        as_base64 = payload.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embed_text(text, dim)
+            encoded = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+        tokens = sum(len(t) if isinstance(t, list) else count_tokens(str(t)) for t in inputs)
+        return {"object": "list", "data": data, "model": str(payload.get("model", "text-embedding-3-small")),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    async def route(self, method: str, path: str, body: bytes):
+        """(status, JSON payload) or (200, async iterator of SSE events)."""
+        if path.startswith("/v1/"):
+            path = path[3:]
+        if path == "/health":
+            return 200, {"status": "ok", "uptime_s": round(time.time() - self.started, 1)}
+        if path == "/stats":
+            return 200, {f"{route} {status}": n for (route, status), n in sorted(self.stats.items())}
+        if path == "/models":
+            return 200, {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "mock"} for m in MODELS]}
+        if path not in ("/chat/completions", "/embeddings"):
+            raise MockError(404, f"No route for {path}", "invalid_request_error")
+        if method != "POST":
+            raise MockError(405, "Use POST", "invalid_request_error")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise MockError(400, "Body must be JSON", "invalid_request_error")
+        if not isinstance(payload, dict):
+            raise MockError(400, "Body must be a JSON object", "invalid_request_error")
+
+        self.admit()
+        if path == "/embeddings":
+            result = self.embeddings(payload)
+            await self.delay()
+            return 200, result
+        completion, pieces = self.chat_completion(payload)
+        await self.delay()
+        if payload.get("stream"):
+            include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+            return 200, self.stream_chat(completion, pieces, include_usage)
+        return 200, completion
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                path = target.split("?", 1)[0]
+                extra = ""
+                try:
+                    try:
+                        length = int(headers.get("content-length", "0"))
+                    except ValueError:
+                        keep_alive = False
+                        raise MockError(400, "Invalid Content-Length", "invalid_request_error")
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise MockError(413, "Request body too large", "invalid_request_error")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.route(method, path, body)
+                except MockError as e:
+                    status, payload = e.status, e.body()
+                    if e.retry_after is not None:
+                        extra = f"Retry-After: {max(1, round(e.retry_after))}\r\nRetry-After-Ms: {round(e.retry_after * 1000)}\r\n"
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload = 500, {"error": {"message": f"{type(e).__name__}: {e}", "type": "server_error",
+                                                      "param": None, "code": None}}
+                self.stats[(path, status)] += 1
+
+                if isinstance(payload, dict):
+                    data = json.dumps(payload).encode("utf-8")
+                    writer.write(
+                        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                        f"Content-Type: application/json\r\n{extra}"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                    )
+                    await writer.drain()
+                else:
+                    # Server-sent events in chunked transfer encoding, so the connection can be reused.
+                    writer.write(
+                        f"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                        f"Transfer-Encoding: chunked\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    )
+                    async for event in payload:
+                        writer.write(f"{len(event):x}\r\n".encode("latin-1") + event + b"\r\n")
+                        await writer.drain()
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        cfg = self.config
+        print(f"Mock OpenAI server listening on http://{host}:{port}/v1 (latency {cfg.latency_ms:g}+{cfg.jitter_ms:g} ms, "
+              f"{cfg.token_ms:g} ms/token, rpm {cfg.rpm:g}, 429 rate {cfg.rate_limit_rate:g}, "
+              f"500 rate {cfg.error_rate:g}).", flush=True)
+        async with server:
+            await server.serve_forever()
+
+def add_fault_arguments(ap: argparse.ArgumentParser) -> None:
+    """Fault-injection flags, shared with the load-test driver that starts this server."""
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every response (TTFT when streaming)")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random extra latency, up to this much")
+    ap.add_argument("--token-ms", type=float, default=0.0, help="Delay between streamed tokens")
+    ap.add_argument("--rpm", type=float, default=0.0, help="Requests per minute before answering 429 (0 = unlimited)")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a random 429")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    ap.add_argument("--completion-tokens", type=int, default=80, help="Reply length when a request sets no max_tokens")
+    ap.add_argument("--dim", type=int, default=1536, help="Embedding dimensions when a request sets none")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and injected errors")
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, token_ms=args.token_ms, rpm=args.rpm,
+                      rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                      completion_tokens=args.completion_tokens, dim=args.dim, seed=args.seed)
+
+def main():
+    ap = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server with fault injection")
+    ap.add_argument("--host", default="127.0.0.1", help="Bind address")
+    ap.add_argument("--port", type=int, default=8765, help="Port")
+    add_fault_arguments(ap)
+    args = ap.parse_args()
+    try:
+        asyncio.run(MockOpenAIServer(config_from_args(args)).run(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+if __name__ == "__main__":
+    main()
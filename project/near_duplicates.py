@@ -0,0 +1,132 @@
+"""Near-duplicate listing detection with MinHash and LSH banding."""
+import re
+import zlib
+from itertools import chain
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+DEDUP_SETTINGS = {"threshold": 0.8, "num_perm": 128, "shingle_words": 3, "seed": 1}
+_MASK32 = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r"\w+")
+_CHUNK_LISTINGS = 256
+LSH_RECALL = 0.98  # chance that a pair right at the threshold becomes a candidate
+
+def listing_text(listing: dict) -> str:
+    return " ".join((listing.get("neighborhood", ""), listing.get("description", ""),
+                     listing.get("neighborhood_description", "")))
+
+def choose_bands(num_perm: int, threshold: float, recall: float = LSH_RECALL) -> Tuple[int, int]:
+    """(bands, rows) for `num_perm` slots: the most rows per band that keep `recall` at `threshold`."""
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1.0 - (1.0 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+class _WordHasher:
+    """Stable 32-bit word hashes (crc32), computed once per distinct word."""
+    def __init__(self):
+        self._cache: Dict[str, int] = {}
+
+    def __call__(self, text: str) -> List[int]:
+        cache = self._cache
+        words = _WORD_RE.findall(text.lower())
+        for w in set(words).difference(cache):
+            cache[w] = zlib.crc32(w.encode("utf-8"))
+        return [cache[w] for w in words]
+
+def _chunk_signatures(word_hashes: List[List[int]], shingle_words: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Texts shorter than a shingle are padded with hash 0, so every text has at least one shingle.
+    padded = [h + [0] * (shingle_words - len(h)) if len(h) < shingle_words else h for h in word_hashes]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    words = np.fromiter(chain.from_iterable(padded), dtype=np.uint64, count=int(lengths.sum()))
+    n_shingles = lengths - shingle_words + 1
+    # Shingle j of a text starts at word j; windows are mixed over the whole chunk and then
+    # only those that start inside their own text are kept.
+    span = len(words) - shingle_words + 1
+    mixed = words[:span].copy()
+    for i in range(1, shingle_words):
+        mixed = (mixed * np.uint64(0x9E3779B1) + words[i:span + i]) & _MASK32
+    text_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    keep = np.concatenate([np.arange(s, s + n) for s, n in zip(text_starts, n_shingles)])
+    shingles = mixed[keep]
+    # Multiply-shift hashing: the top 32 bits of (a * x + b) mod 2**64 (uint64 arithmetic wraps).
+    hashed = np.multiply(a, shingles[None, :])
+    hashed += b
+    hashed >>= np.uint64(32)
+    starts = np.concatenate([[0], np.cumsum(n_shingles)[:-1]])
+    return np.minimum.reduceat(hashed, starts, axis=1).T
+
+def minhash_signatures(texts: Iterable[str], num_perm: int = 128, shingle_words: int = 3,
+                       seed: int = 1) -> np.ndarray:
+    """(n, num_perm) uint64 MinHash signatures, computed chunk by chunk."""
+    rng = np.random.RandomState(seed)
+    a = (rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64) << np.uint64(32)
+         | rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+    b = (rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64) << np.uint64(32)
+         | rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64))[:, None]
+    hasher = _WordHasher()
+    blocks: List[np.ndarray] = []
+    chunk: List[List[int]] = []
+    for text in texts:
+        chunk.append(hasher(text))
+        if len(chunk) >= _CHUNK_LISTINGS:
+            blocks.append(_chunk_signatures(chunk, shingle_words, a, b))
+            chunk = []
+    if chunk:
+        blocks.append(_chunk_signatures(chunk, shingle_words, a, b))
+    return np.concatenate(blocks) if blocks else np.zeros((0, num_perm), dtype=np.uint64)
+
+def cluster_representatives(signatures: np.ndarray, threshold: float) -> np.ndarray:
+    """For each row, the lowest row of its near-duplicate cluster (itself when unique)."""
+    n, num_perm = signatures.shape
+    parent = np.arange(n)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    bands, rows = choose_bands(num_perm, threshold)
+    for band in range(bands):
+        block = signatures[:, band * rows:(band + 1) * rows]
+        # Collapse the band to one key per row; key collisions only add candidates, which are verified below.
+        key = np.zeros(n, dtype=np.uint64)
+        for col in range(rows):
+            key = key * np.uint64(1000003) ^ block[:, col]
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        bounds = np.flatnonzero(np.diff(sorted_key)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [n]])
+        # Every pair in a bucket is verified, not just pairs with its first member:
+        # two near-duplicates can share a bucket with a leader unlike either of them.
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = order[start:end]
+            for pos in range(len(members) - 1):
+                i = int(members[pos])
+                root = find(i)
+                rest = np.array([j for j in members[pos + 1:] if find(int(j)) != root], dtype=np.int64)
+                if not len(rest):
+                    continue
+                similarity = (signatures[rest] == signatures[i]).mean(axis=1)
+                for j in rest[similarity >= threshold]:
+                    ri, rj = find(i), find(int(j))
+                    if ri != rj:
+                        parent[max(ri, rj)] = min(ri, rj)
+    return np.fromiter((find(i) for i in range(n)), dtype=np.int64, count=n)
+
+def find_near_duplicates(texts: Iterable[str], settings: dict = DEDUP_SETTINGS) -> np.ndarray:
+    """Representative position per text (see `cluster_representatives`)."""
+    signatures = minhash_signatures(texts, settings["num_perm"], settings["shingle_words"], settings["seed"])
+    return cluster_representatives(signatures, settings["threshold"])
+
+def dedupe_listings(listings: List[dict], settings: dict = DEDUP_SETTINGS) -> Tuple[List[dict], np.ndarray]:
+    """Keep one listing per near-duplicate cluster; returns (kept listings, their original positions)."""
+    if not listings:
+        return [], np.zeros(0, dtype=np.int64)
+    representative = find_near_duplicates([listing_text(l) for l in listings], settings)
+    keep = np.flatnonzero(representative == np.arange(len(listings)))
+    return [listings[i] for i in keep], keep
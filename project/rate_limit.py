@@ -0,0 +1,61 @@
+"""Client-side rate limiting (token buckets) and retries with backoff for HomeMatch API calls."""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # A request larger than the bucket only has to wait for a full bucket.
+        return max(0.0, min(amount, self.capacity) - self.level) / self.rate
+
+class AsyncRateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter (0 or None disables a limit)."""
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until one request of `tokens` estimated tokens fits both limits, then take it."""
+        # Waiters queue on the lock, so they are served in arrival order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0.0:
+                    break
+                await asyncio.sleep(wait)
+            if self._requests is not None:
+                self._requests.level -= 1
+            if self._tokens is not None:
+                self._tokens.level -= min(tokens, self._tokens.capacity)
+
+async def retry_async(fn: Callable[[], Awaitable[T]], retries: int = 3, base_delay: float = 1.0,
+                      max_delay: float = 30.0, retry_on: Tuple[Type[BaseException], ...] = (Exception,)) -> T:
+    """Await `fn()`, retrying up to `retries` times on `retry_on` errors with jittered exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except retry_on:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(random.uniform(0.0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
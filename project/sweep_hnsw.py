@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Recall-versus-latency sweep of Chroma HNSW settings over the cached listing embeddings."""
+import argparse
+import json
+import time
+from itertools import product
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmark_offline import environment, latency_summary, timed
+from homematch_cache import DEFAULT_CACHE_PATH, load_cached_vectors
+from homematch_hnsw import DEFAULT_HNSW, HNSW_SPACES, collection_metadata, distances, hnsw_settings
+from homematch_ingest import WRITE_BATCH
+from listing_store import ListingStore
+
+RESULTS_SCHEMA = 1
+
+def synthetic_vectors(n: int, dim: int, seed: int, clusters: int = 64) -> np.ndarray:
+    """Unit vectors around random cluster centres, a rough stand-in for text embeddings."""
+    rng = np.random.RandomState(seed)
+    centres = rng.randn(clusters, dim)
+    vectors = centres[rng.randint(0, clusters, n)] + 0.5 * rng.randn(n, dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def split_queries(vectors: np.ndarray, n_queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(corpus, queries): `n_queries` random rows held out of the corpus."""
+    order = np.random.RandomState(seed).permutation(len(vectors))
+    return vectors[order[n_queries:]], vectors[order[:n_queries]]
+
+def exact_neighbours(space: str, corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    return [set(np.argsort(distances(space, corpus, q), kind="stable")[:k].tolist()) for q in queries]
+
+def measure(client, settings: dict, corpus: np.ndarray, queries: np.ndarray, truth: List[set], k: int) -> dict:
+    name = "hnsw_sweep"
+    collection = client.create_collection(name, metadata=collection_metadata(settings))
+
+    def build():
+        for start in range(0, len(corpus), WRITE_BATCH):
+            block = corpus[start:start + WRITE_BATCH]
+            collection.add(ids=[str(i) for i in range(start, start + len(block))], embeddings=block.tolist())
+    _, build_seconds = timed(build)
+
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & set(int(i) for i in result["ids"][0])) / k)
+    client.delete_collection(name)
+    return {"settings": settings, "build_seconds": round(build_seconds, 3),
+            f"recall_at_{k}": round(float(np.mean(recalls)), 4), "latency": latency_summary(latencies)}
+
+def int_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep Chroma HNSW settings for recall and query latency")
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Embedding cache file to take vectors from")
+    ap.add_argument("--listings", default="listings.json", help="Listings file whose document embeddings to use")
+    ap.add_argument("--model", default="text-embedding-3-small", help="Embedding model whose cached vectors to use")
+    ap.add_argument("--limit", type=int, default=None, help="Use at most this many cached vectors")
+    ap.add_argument("--synthetic", type=int, default=0, help="Use this many synthetic vectors instead of the cache")
+    ap.add_argument("--dim", type=int, default=1536, help="Dimensions of synthetic vectors")
+    ap.add_argument("--space", choices=HNSW_SPACES, default=DEFAULT_HNSW["space"], help="Distance function")
+    ap.add_argument("--m", default="8,16,32", help="Comma-separated hnsw:M values")
+    ap.add_argument("--ef-construction", default="100,200", help="Comma-separated hnsw:construction_ef values")
+    ap.add_argument("--ef-search", default="10,50,100", help="Comma-separated hnsw:search_ef values")
+    ap.add_argument("--queries", type=int, default=200, help="Vectors held out as queries")
+    ap.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k")
+    ap.add_argument("--target-recall", type=float, default=0.95, help="Recall the recommended setting must reach")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for synthetic vectors and the query split")
+    ap.add_argument("--output", default="hnsw_sweep.json", help="JSON results file")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, args.seed)
+        source = f"{args.synthetic:,} synthetic {args.dim}-d vectors"
+    else:
+        texts = ListingStore.load(args.listings).page_contents()
+        vectors = load_cached_vectors(args.cache, args.model, texts, args.limit)
+        source = f"{len(vectors):,} cached {args.model} vectors of {args.listings} listings from {args.cache}"
+    if len(vectors) < args.queries + args.k:
+        raise SystemExit(f"Need more than {args.queries + args.k} vectors, found {len(vectors)} "
+                         "(run the app on the listings file first to fill the embedding cache, or use --synthetic).")
+    corpus, queries = split_queries(vectors, args.queries, args.seed)
+    print(f"Sweeping HNSW settings on {source}: {len(corpus):,} indexed, {len(queries)} queries, k={args.k}.")
+    truth = exact_neighbours(args.space, corpus, queries, args.k)
+
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    results = []
+    for m, ef_construction, ef_search in product(int_list(args.m), int_list(args.ef_construction),
+                                                 int_list(args.ef_search)):
+        settings = hnsw_settings(args.space, m, ef_construction, ef_search)
+        print(f"  M={m} construction_ef={ef_construction} search_ef={ef_search}...")
+        results.append(measure(client, settings, corpus, queries, truth, args.k))
+
+    recall_key = f"recall_at_{args.k}"
+    good = [r for r in results if r[recall_key] >= args.target_recall]
+    best = min(good, key=lambda r: r["latency"]["p50_ms"]) if good else None
+    print(f"\n{'M':>4} {'ef_c':>6} {'ef_s':>6} {'build s':>9} {'recall':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        s = r["settings"]
+        mark = "  <- fastest at target recall" if r is best else ""
+        print(f"{s['M']:>4} {s['construction_ef']:>6} {s['search_ef']:>6} {r['build_seconds']:>9.2f} "
+              f"{r[recall_key]:>8.3f} {r['latency']['p50_ms']:>9.3f} {r['latency']['p99_ms']:>9.3f}{mark}")
+    if best is None:
+        print(f"\nNo setting reached recall {args.target_recall:.2f}; try larger --m/--ef-search values.")
+    else:
+        s = best["settings"]
+        print(f"\nFor homematch_app.py (.env):\nHOMEMATCH_HNSW_SPACE={s['space']}\nHOMEMATCH_HNSW_M={s['M']}\n"
+              f"HOMEMATCH_HNSW_EF_CONSTRUCTION={s['construction_ef']}\nHOMEMATCH_HNSW_EF_SEARCH={s['search_ef']}")
+
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "environment": environment(),
+        "config": {"source": source, "corpus": len(corpus), "queries": len(queries), "k": args.k,
+                   "space": args.space, "target_recall": args.target_recall, "seed": args.seed},
+        "results": results,
+        "recommended": best["settings"] if best else None,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Deterministic synthetic listings and buyer profiles for HomeMatch benchmarks."""
+import argparse
+import json
+import random
+from typing import Iterator, List
+
+NEIGHBORHOOD_PREFIXES = [
+    "Green", "Harbor", "Maple", "Cedar", "Willow", "River", "Oak", "Pine", "Sunset", "Lake",
+    "Hill", "Stone", "Bay", "Meadow", "Brook", "Aspen", "Birch", "Elm", "Fox", "Silver",
+]
+NEIGHBORHOOD_SUFFIXES = [
+    "Oaks", "View", "Ridge", "Park", "Creek", "Heights", "Flats", "Commons", "Crossing",
+    "Gardens", "Point", "Village", "Square", "Terrace", "Glen", "Landing",
+]
+HOME_TYPES = ["home", "condo", "townhouse", "bungalow", "craftsman", "loft", "colonial", "ranch", "duplex"]
+STYLES = ["Charming", "Modern", "Spacious", "Renovated", "Contemporary", "Cozy", "Sunny", "Elegant", "Classic"]
+PROPERTY_FEATURES = [
+    "an open-concept kitchen with quartz counters", "hardwood floors throughout", "a cozy fireplace",
+    "a fenced backyard ideal for gardening", "a two-car garage", "solar panels and new insulation",
+    "an energy-efficient HVAC system", "a primary suite with a walk-in closet", "a sunny breakfast nook",
+    "a private patio", "vaulted ceilings", "a finished basement", "a home office with built-ins",
+    "double-pane windows", "a chef's kitchen with a gas range", "a rooftop deck", "in-unit laundry",
+    "a detached garage with workshop space", "raised garden beds", "a covered front porch",
+]
+NEIGHBORHOOD_FEATURES = [
+    "highly rated public schools", "a weekend farmers market", "quick access to the highway",
+    "bike paths and a bikeshare station", "a nearby bus line", "a subway stop within walking distance",
+    "ferry access to downtown", "waterfront parks and trails", "local restaurants and cafes",
+    "independent theaters and galleries", "a shopping plaza", "a quiet, tree-lined street",
+    "community gardens", "neighborhood playgrounds", "an express bus to the city center",
+    "a greenbelt with hiking trails", "family-owned eateries", "a grocery store around the corner",
+]
+STREET_SUFFIXES = ["Street", "Avenue", "Lane", "Drive", "Court", "Way", "Road", "Place"]
+VIBES = ["family-friendly", "walkable", "quiet", "lively", "up-and-coming", "established", "eco-conscious", "artsy"]
+BUYER_WISHES = [
+    "A comfortable {beds}-bedroom {home_type} with {feature}.",
+    "{Vibe} neighborhood with {amenity}.",
+    "{Feature} and {feature2}.",
+    "Easy access to {nfeature} and {nfeature2}.",
+    "A budget of around ${budget:,}.",
+]
+
+NEIGHBORHOODS = [f"{p} {s}" for p in NEIGHBORHOOD_PREFIXES for s in NEIGHBORHOOD_SUFFIXES]
+
+def _article(word: str) -> str:
+    return ("an " if word[0] in "aeiou" else "a ") + word
+
+def synthetic_listing(i: int, seed: int = 0) -> dict:
+    """Listing i of the corpus for `seed`; independent of how many listings are generated."""
+    rng = random.Random(seed * 1_000_003 + i)
+    n_idx = rng.randrange(len(NEIGHBORHOODS))
+    neighborhood = NEIGHBORHOODS[n_idx]
+    tier = 0.7 + (n_idx % 7) * 0.15  # neighborhoods have a stable price level
+    bedrooms = rng.choices([1, 2, 3, 4, 5, 6], weights=[8, 22, 32, 24, 10, 4])[0]
+    bathrooms = max(1.0, min(bedrooms + 0.5, round(rng.uniform(0.6, 1.1) * bedrooms * 2) / 2))
+    sqft = int(round(rng.gauss(450 + bedrooms * 480, 220) / 10.0) * 10)
+    sqft = max(450, sqft)
+    price = int(round(sqft * rng.uniform(220, 420) * tier / 1000.0) * 1000)
+    home_type = rng.choice(HOME_TYPES)
+    features = rng.sample(PROPERTY_FEATURES, rng.randint(2, 4))
+    nfeatures = rng.sample(NEIGHBORHOOD_FEATURES, rng.randint(2, 3))
+    description = (
+        f"{rng.choice(STYLES)} {bedrooms}-bedroom {home_type} with {features[0]} and {features[1]}."
+        + (f" It also has {' and '.join(features[2:])}." if len(features) > 2 else "")
+        # Street numbers give the vocabulary the long tail of rare terms real listings have.
+        + f" Located at {rng.randint(1, 9999)} {rng.choice(NEIGHBORHOOD_PREFIXES)} {rng.choice(STREET_SUFFIXES)}."
+    )
+    neighborhood_description = (
+        f"{neighborhood} is {_article(rng.choice(VIBES))} area with {nfeatures[0]} and {nfeatures[1]}."
+        + (f" Residents enjoy {nfeatures[2]}." if len(nfeatures) > 2 else "")
+    )
+    return {
+        "neighborhood": neighborhood,
+        "price": price,
+        "bedrooms": bedrooms,
+        "bathrooms": bathrooms,
+        "house_size_sqft": sqft,
+        "description": description,
+        "neighborhood_description": neighborhood_description,
+    }
+
+def iter_synthetic_listings(n: int, seed: int = 0) -> Iterator[dict]:
+    for i in range(n):
+        yield synthetic_listing(i, seed)
+
+def write_synthetic_listings(path: str, n: int, seed: int = 0) -> None:
+    """Stream n listings to `path` in the listings.json layout without holding them in memory."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{\n  "listings": [\n')
+        for i, listing in enumerate(iter_synthetic_listings(n, seed)):
+            f.write(("    " if i == 0 else ",\n    ") + json.dumps(listing))
+        f.write("\n  ]\n}\n")
+
+def synthetic_profile_answers(i: int, seed: int = 0) -> List[str]:
+    """Buyer questionnaire answers for profile i, in the style of the default buyer profile."""
+    rng = random.Random(seed * 1_000_003 + i + (1 << 40))
+    features = rng.sample(PROPERTY_FEATURES, 3)
+    nfeatures = rng.sample(NEIGHBORHOOD_FEATURES, 3)
+    values = {
+        "beds": rng.choice([2, 3, 3, 4, 5]), "home_type": rng.choice(HOME_TYPES),
+        "feature": features[0], "Feature": features[1][0].upper() + features[1][1:], "feature2": features[2],
+        "Vibe": _article(rng.choice(VIBES)).capitalize(), "amenity": nfeatures[0], "nfeature": nfeatures[1], "nfeature2": nfeatures[2],
+        "budget": rng.randrange(300, 1500) * 1000,
+    }
+    return [template.format(**values) for template in rng.sample(BUYER_WISHES, rng.randint(3, 5))]
+
+def write_synthetic_profiles(path: str, n: int, seed: int = 0) -> None:
+    """Batch-mode profiles JSONL: {"id": "buyer-<i>", "answers": [...]} per line."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"buyer-{i}", "answers": synthetic_profile_answers(i, seed)}) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate deterministic synthetic HomeMatch listings or buyer profiles")
+    ap.add_argument("--n", type=int, default=10000, help="Number of listings to generate")
+    ap.add_argument("--profiles", type=int, default=0, help="Generate this many buyer profiles (JSONL) instead of listings")
+    ap.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    ap.add_argument("--output", required=True, help="Output path")
+    args = ap.parse_args()
+    if args.profiles:
+        write_synthetic_profiles(args.output, args.profiles, args.seed)
+        print(f"Wrote {args.profiles} synthetic buyer profiles to {args.output}.")
+    else:
+        write_synthetic_listings(args.output, args.n, args.seed)
+        print(f"Wrote {args.n} synthetic listings to {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from langchain_core.embeddings import Embeddings
+
+import homematch_cache
+from homematch_cache import CachedEmbeddings, ResponseCache, load_cached_vectors
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_embedding_cache_only_embeds_missing_texts(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "model-a", str(tmp_path / "e.sqlite3"))
+    assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cache.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+    assert CachedEmbeddings(inner, "model-b", cache.path).lookup(["a"]) == [None]
+
+def test_response_cache_ttl_and_lru(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(homematch_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "r.sqlite3"), ttl=60, max_entries=2)
+    cache.put("a", "A")
+    now[0] += 1
+    cache.put("b", "B")
+    now[0] += 1
+    assert cache.get("a") == "A"  # "b" is now the least recently used
+    now[0] += 1
+    cache.put("c", "C")
+    assert cache.get("b") is None and cache.get("a") == "A" and cache.get("c") == "C"
+    now[0] += 61
+    assert cache.get("c") is None and cache.expired == 1
+
+def test_cached_vectors_are_selected_by_document_text(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), "model-a", str(tmp_path / "e.sqlite3"))
+    cache.embed_documents(["doc one", "doc number two"])
+    cache.embed_query("a buyer profile query")
+    vectors = load_cached_vectors(cache.path, "model-a", ["doc number two", "doc one", "never embedded"])
+    assert vectors.tolist() == [[14.0, 1.0], [7.0, 1.0]]
+    assert load_cached_vectors(cache.path, "model-a", ["doc one", "a buyer profile query"], limit=1).tolist() == [[7.0, 1.0]]
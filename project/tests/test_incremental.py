@@ -0,0 +1,44 @@
+import numpy as np
+
+from feature_matcher import feature_masks
+from homematch_incremental import IncrementalIndex
+from homematch_index import IndexSnapshot, fit_tfidf
+from listing_store import ListingStore
+from synthetic_listings import synthetic_listing
+
+def open_index(n):
+    store = ListingStore.from_listings([synthetic_listing(i) for i in range(n)])
+    vectorizer, X = fit_tfidf(store.page_contents())
+    snapshot = IndexSnapshot(vectorizer, X, "test", features=feature_masks(store.feature_texts()), n_docs=n)
+    return IncrementalIndex(snapshot, store), store
+
+def idf_by_term(vocabulary, idf):
+    return {term: idf[col] for term, col in vocabulary.items()}
+
+def test_add_remove_and_compaction_match_a_full_rebuild():
+    index, store = open_index(200)
+    index.add_listings([synthetic_listing(i) for i in range(1000, 1060)])
+    assert index.remove_ids(["listing_3", "listing_50", "listing_210"]) == 3
+    live = np.flatnonzero(~index.deleted)
+    rebuilt, X_rebuilt = fit_tfidf(store.page_content(int(r)) for r in live)
+
+    # df/n_docs are kept exact on every change, so the query-time idf already matches a rebuild.
+    current = idf_by_term(index.vocabulary, index.current_idf())
+    for term, idf in idf_by_term(rebuilt.vocabulary_, rebuilt.idf_).items():
+        assert abs(current[term] - idf) < 1e-9
+
+    index.compact(background=False)
+    assert index.wait_for_compaction()
+    X = index.as_matrix()
+    assert X[index.deleted].nnz == 0
+    order = [index.vocabulary[t] for t, _ in sorted(rebuilt.vocabulary_.items(), key=lambda kv: kv[1])]
+    np.testing.assert_allclose(X[live][:, order].toarray(), X_rebuilt.toarray(), atol=1e-12)
+    query = store.page_content(7)
+    np.testing.assert_allclose(index.transform([query])[:, order].toarray(), rebuilt.transform([query]).toarray(),
+                               atol=1e-12)
+
+def test_tombstoned_rows_are_never_returned():
+    index, _ = open_index(100)
+    index.remove_ids(["listing_0", "listing_1"])
+    top = [row for row, _ in index.search(index.store.page_content(0), k=5)]
+    assert 0 not in top and 1 not in top
@@ -0,0 +1,70 @@
+import json
+import shutil
+
+import numpy as np
+
+from homematch_index import fit_tfidf, load_or_build_index, load_snapshot, snapshot_path
+import listing_store
+from listing_store import ListingStore
+from synthetic_listings import synthetic_listing, synthetic_profile_answers
+
+def write_listings(path, listings):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"listings": listings}, f)
+
+def build(path, index_dir):
+    return load_or_build_index(str(path), lambda: ListingStore.load(str(path)), index_dir=str(index_dir))
+
+def test_snapshot_round_trip_and_fingerprint(tmp_path):
+    listings = tmp_path / "listings.json"
+    write_listings(listings, [synthetic_listing(i) for i in range(200)])
+    built = build(listings, tmp_path / "idx")
+    loaded = load_snapshot(snapshot_path(str(listings), str(tmp_path / "idx")), built.fingerprint)
+    assert loaded is not None and loaded.fingerprint == built.fingerprint
+    assert (loaded.matrix != built.matrix).nnz == 0
+    assert [loaded.store.page_content(i) for i in range(5)] == [built.store.page_content(i) for i in range(5)]
+    assert build(listings, tmp_path / "idx").fingerprint == built.fingerprint
+
+    write_listings(listings, [synthetic_listing(i) for i in range(201)])
+    assert load_snapshot(built.path, build(listings, tmp_path / "idx").fingerprint).matrix.shape[0] == 201
+    assert load_snapshot(built.path, built.fingerprint) is None
+
+def test_same_file_name_in_different_directories_gets_its_own_snapshot(tmp_path):
+    for name, start in (("a", 0), ("b", 500)):
+        (tmp_path / name).mkdir()
+        write_listings(tmp_path / name / "listings.json", [synthetic_listing(i) for i in range(start, start + 50)])
+    a = build(tmp_path / "a" / "listings.json", tmp_path / "idx")
+    b = build(tmp_path / "b" / "listings.json", tmp_path / "idx")
+    assert a.path != b.path
+    assert build(tmp_path / "a" / "listings.json", tmp_path / "idx").fingerprint == a.fingerprint
+
+def test_snapshot_vectorizer_matches_sklearn(tmp_path):
+    listings = tmp_path / "listings.json"
+    write_listings(listings, [synthetic_listing(i) for i in range(300)])
+    store = ListingStore.load(str(listings))
+    fitted, _ = fit_tfidf(store.page_contents())
+    snapshot = build(listings, tmp_path / "idx")
+    queries = ["\n".join(synthetic_profile_answers(i)) for i in range(20)] + ["", "Unknown words only"]
+    expected = fitted.transform(queries).toarray()
+    np.testing.assert_allclose(snapshot.vectorizer.transform(queries).toarray(), expected, atol=1e-12)
+
+def test_numeric_index_orders_are_saved_and_memory_mapped(tmp_path):
+    store = ListingStore.from_listings([synthetic_listing(i) for i in range(300)])
+    store.save(str(tmp_path / "store"))
+    opened = ListingStore.open(str(tmp_path / "store"))
+    assert isinstance(opened.numeric_index.order["price"], np.memmap)
+    ranges = {"price": (300000, 600000), "bedrooms": (3, None)}
+    price, beds = store.columns["price"], store.columns["bedrooms"]
+    expected = np.flatnonzero((price >= 300000) & (price <= 600000) & (beds >= 3))
+    assert opened.numeric_index.filter_rows(ranges).tolist() == expected.tolist()
+    opened.extend([synthetic_listing(300)])
+    assert len(opened.numeric_index.order["price"]) == 301
+
+def test_streamed_load_matches_the_parsed_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_store, "_READ_CHARS", 7)  # tiny blocks split values at every boundary
+    listings = [synthetic_listing(i) for i in range(40)]
+    path = tmp_path / "listings.json"
+    path.write_text(json.dumps({"source": {"listings": 0}, "listings": listings}, indent=2))
+    assert list(listing_store.iter_listings(str(path))) == listings
+    store = ListingStore.load(str(path))
+    assert [dict(store[i].metadata) for i in range(40)] == [dict(v.metadata) for v in ListingStore.from_listings(listings)]
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+import listing_store
+from homematch_index import load_listing_store
+from near_duplicates import DEDUP_SETTINGS, choose_bands, cluster_representatives, dedupe_listings
+from synthetic_listings import synthetic_listing
+
+def relisted(listing, **changes):
+    return dict(listing, **changes)
+
+def test_relisted_listings_collapse_to_the_first_copy():
+    listings = [synthetic_listing(i) for i in range(50)]
+    listings.append(relisted(listings[3], price=listings[3]["price"] + 5000))
+    listings.append(relisted(listings[10]))
+    kept, positions = dedupe_listings(listings)
+    assert positions.tolist() == list(range(50))
+    assert kept == listings[:50]
+
+def test_distinct_listings_are_kept():
+    listings = [synthetic_listing(i) for i in range(300)]
+    kept, positions = dedupe_listings(listings)
+    assert len(kept) == len(set(l["description"] for l in listings))
+    assert np.all(np.diff(positions) > 0)
+
+def test_pairs_sharing_a_bucket_with_a_dissimilar_leader_are_linked():
+    bands, rows = choose_bands(128, 0.8)
+    rng = np.random.RandomState(0)
+    a = rng.randint(1, 1 << 32, size=128).astype(np.uint64)
+    b = a.copy()
+    b[rows::rows] += np.uint64(1)  # b shares only band 0 with a, but matches it in most slots
+    leader = rng.randint(1, 1 << 32, size=128).astype(np.uint64)
+    leader[:rows] = a[:rows]  # the first row of band 0's bucket, unlike a and b elsewhere
+    representative = cluster_representatives(np.stack([leader, a, b]), 0.8)
+    assert representative.tolist() == [0, 1, 1]
+
+def test_dedup_positions_are_cached_beside_the_snapshot(tmp_path, monkeypatch):
+    listings = [synthetic_listing(i) for i in range(20)] + [synthetic_listing(4)]
+    path = tmp_path / "listings.json"
+    path.write_text(json.dumps({"listings": listings}))
+    index_dir = str(tmp_path / "index")
+    first = load_listing_store(str(path), DEDUP_SETTINGS, index_dir)
+    monkeypatch.setattr(listing_store, "find_near_duplicates", None)  # a second load must not recompute
+    second = load_listing_store(str(path), DEDUP_SETTINGS, index_dir)
+    assert second.n_dropped == first.n_dropped == 1
+    assert second.ids.tolist() == first.ids.tolist() == list(range(20))
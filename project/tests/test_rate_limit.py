@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limit import AsyncRateLimiter, retry_async
+
+def test_rate_limiter_allows_a_burst_then_waits_for_refill():
+    async def run():
+        limiter = AsyncRateLimiter(requests_per_minute=600, tokens_per_minute=600)
+        start = time.monotonic()
+        for _ in range(6):
+            await limiter.acquire(tokens=100)  # one minute's token budget goes through at once
+        burst = time.monotonic() - start
+        await limiter.acquire(tokens=3)  # then waits for 3 tokens at 10 tokens/s
+        return burst, time.monotonic() - start
+    burst, total = asyncio.run(run())
+    assert burst < 0.05
+    assert 0.25 <= total < 1.0
+
+def test_retry_async_retries_only_listed_errors():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("try again")
+        return "ok"
+
+    assert asyncio.run(retry_async(flaky, retries=3, base_delay=0.0, retry_on=(ConnectionError,))) == "ok"
+    assert len(calls) == 3
+
+    async def broken():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        asyncio.run(retry_async(broken, retries=3, base_delay=0.0, retry_on=(ConnectionError,)))
+    assert len(calls) == 1
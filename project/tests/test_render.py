@@ -0,0 +1,48 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+
+from listing_store import ListingStore
+from synthetic_listings import synthetic_listing
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "homematch_offline.py")
+
+def write_listings(path, listings):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"listings": listings}, f)
+
+def run_cli(tmp_path, *args):
+    subprocess.run([sys.executable, CLI, "--listings", "base.json", "--index-dir", "idx", *args],
+                   cwd=tmp_path, check=True, capture_output=True)
+
+def test_render_after_compaction_uses_the_matched_listing(tmp_path):
+    base = [synthetic_listing(i) for i in range(300)]
+    folded = [synthetic_listing(i) for i in range(1000, 1100)]
+    pending = [synthetic_listing(i) for i in range(2000, 2005)]
+    write_listings(tmp_path / "base.json", base)
+    write_listings(tmp_path / "folded.json", folded)
+    write_listings(tmp_path / "pending.json", pending)
+    with open(tmp_path / "profiles.jsonl", "w", encoding="utf-8") as f:
+        for i, listing in enumerate(pending):
+            f.write(json.dumps({"id": f"buyer-{i}", "answers": [listing["description"]]}) + "\n")
+
+    run_cli(tmp_path)
+    # Drift tolerance 0 compacts, folding these adds into the snapshot store.
+    run_cli(tmp_path, "--add-listings", "folded.json", "--drift-tolerance", "0")
+    [meta] = glob.glob(str(tmp_path / "idx" / "*" / "meta.json"))
+    with open(meta, encoding="utf-8") as f:
+        assert json.load(f)["delta_applied"] == len(folded)
+    run_cli(tmp_path, "--add-listings", "pending.json", "--batch-profiles", "profiles.jsonl",
+            "--batch-output", "matches.jsonl", "--render-output", "rendered.jsonl", "--render-workers", "1")
+
+    store = ListingStore.from_listings(base)
+    store.extend(folded)
+    store.extend(pending)
+    with open(tmp_path / "matches.jsonl") as m, open(tmp_path / "rendered.jsonl") as r:
+        for matched, rendered in zip(m, r):
+            for match, out in zip(json.loads(matched)["matches"], json.loads(rendered)["matches"]):
+                md = store[store.row_of(match["listing_id"])].metadata
+                assert f"home in {md['neighborhood']} could" in out["personalized_description"]
+                assert f"${md['price']:,}" in out["personalized_description"]
@@ -0,0 +1,66 @@
+"""Query-time TF-IDF vectorizer rebuilt from a snapshot, so queries never import scikit-learn."""
+import re
+from collections import Counter
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"  # scikit-learn's default token_pattern
+
+def term_counts(analyzer: Callable[[str], List[str]], vocabulary: Dict[str, int],
+                texts: Iterable[str], n_terms: Optional[int] = None) -> sparse.csr_matrix:
+    """Raw term-frequency matrix for `texts` over a fixed vocabulary (unknown terms are dropped)."""
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        counts = Counter(col for col in map(vocabulary.get, analyzer(text)) if col is not None)
+        cols = sorted(counts)
+        indices.extend(cols)
+        data.extend(counts[c] for c in cols)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(len(indptr) - 1, len(vocabulary) if n_terms is None else n_terms),
+    )
+
+class SnapshotVectorizer:
+    """Stand-in for a fitted TfidfVectorizer (word analyzer, l2 norm, smooth idf, raw tf)."""
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, ngram_range: Tuple[int, int],
+                 stop_words: Iterable[str] = (), lowercase: bool = True, token_pattern: str = TOKEN_PATTERN):
+        self.vocabulary_ = vocabulary
+        self.idf_ = idf
+        self.ngram_range = tuple(ngram_range)
+        self.stop_words: FrozenSet[str] = frozenset(stop_words)
+        self.lowercase = lowercase
+        self._token_re = re.compile(token_pattern)
+
+    def _analyze(self, doc: str) -> List[str]:
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = [t for t in self._token_re.findall(doc) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def get_stop_words(self) -> FrozenSet[str]:
+        return self.stop_words
+
+    def build_analyzer(self) -> Callable[[str], List[str]]:
+        return self._analyze
+
+    def transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        X = term_counts(self._analyze, self.vocabulary_, texts)
+        X.data *= self.idf_[X.indices]
+        # Squares are summed strictly left to right per row (cumsum over a zero-padded
+        # block), as scikit-learn's l2 normalization does, so vectors match bit for bit.
+        lengths = np.diff(X.indptr)
+        norms = np.ones(X.shape[0])
+        if X.nnz:
+            padded = np.zeros((X.shape[0], int(lengths.max())))
+            padded[np.repeat(np.arange(X.shape[0]), lengths), np.arange(X.nnz) - np.repeat(X.indptr[:-1], lengths)] = X.data
+            sums = np.cumsum(padded * padded, axis=1)[:, -1]
+            norms[lengths > 0] = np.sqrt(sums[lengths > 0])
+        X.data /= np.repeat(norms, lengths)
+        return X